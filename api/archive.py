@@ -0,0 +1,151 @@
+import heapq
+from collections import Counter
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from .counters import apply_deltas, counter_keys
+from .models import ArchivedDelivery, ArchivedTransportation, Delivery, JobStatus, Transportation
+from .versions import bump_model_version
+
+# hot model -> (archive model, creation timestamp used for the cutoff)
+ARCHIVES = {
+    Delivery: (ArchivedDelivery, 'delivery_issued'),
+    Transportation: (ArchivedTransportation, 'date_requested'),
+}
+
+
+class ArchiveConflict(Exception):
+    """Rows about to be archived already have ids in the archive table."""
+
+    def __init__(self, model, ids):
+        super().__init__(f"{model.__name__} ids already archived: {', '.join(map(str, ids))}")
+        self.model = model
+        self.ids = ids
+
+
+def archive_batch(model, cutoff, batch_size=500):
+    """
+    Move up to ``batch_size`` Arrived rows created before ``cutoff`` into the
+    archive table, in one transaction. Returns how many rows moved.
+
+    A hot row whose id is already archived is never deleted: the batch
+    rolls back and ArchiveConflict names the ids so they can be reconciled
+    by hand.
+
+    Nothing points at job rows, so the hot rows go with one raw DELETE and
+    no per-row signals; the counters move once for the whole batch.
+    """
+    archive_model, date_field = ARCHIVES[model]
+    columns = [f.attname for f in model._meta.concrete_fields]
+    with transaction.atomic():
+        rows = list(
+            model.objects.filter(status=JobStatus.ARRIVED, **{f'{date_field}__lt': cutoff})
+            .order_by('id')
+            .values(*columns)[:batch_size]
+        )
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        clashing = list(archive_model.objects.filter(id__in=ids).values_list('id', flat=True))
+        if clashing:
+            raise ArchiveConflict(model, sorted(clashing))
+        try:
+            archived = archive_model.objects.bulk_create([archive_model(**row) for row in rows])
+        except IntegrityError:
+            # Archived concurrently, between the check and the insert.
+            clashing = sorted(archive_model.objects.filter(id__in=ids).values_list('id', flat=True))
+            raise ArchiveConflict(model, clashing)
+        deltas = Counter()
+        for instance in archived:
+            deltas.update(counter_keys(instance) or ())
+        for row in rows:
+            deltas.subtract(counter_keys(model(**row)) or ())
+        apply_deltas(deltas)  # nets out while both tiers count under one prefix
+        model.objects.filter(id__in=ids)._raw_delete(model.objects.db)
+        bump_model_version(model)
+    return len(rows)
+
+
+class TieredQuerySet:
+    """
+    A hot queryset and its archive counterpart read as one list.
+
+    Supports what list views, reports and OptInCursorPagination need
+    (filtering, ordering, select_related, values/annotate, slicing,
+    iteration). A slice fetches at most ``stop`` rows from each tier and
+    merges them on the ordering, so a page still costs O(page) whichever
+    tier the rows live in. Grouped ``values().annotate()`` rows come back
+    once per tier; callers summing them get the combined totals.
+    """
+
+    def __init__(self, *querysets, ordering=None):
+        self.querysets = querysets
+        self.ordering = ordering or self._default_ordering(querysets[0])
+
+    @staticmethod
+    def _default_ordering(queryset):
+        return tuple(queryset.query.order_by) or ('-id',)
+
+    def _chain(self, method, *args, **kwargs):
+        return TieredQuerySet(*(getattr(qs, method)(*args, **kwargs) for qs in self.querysets), ordering=self.ordering)
+
+    def filter(self, *args, **kwargs):
+        return self._chain('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._chain('exclude', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self._chain('select_related', *fields)
+
+    def prefetch_related(self, *lookups):
+        return self._chain('prefetch_related', *lookups)
+
+    def values(self, *fields, **expressions):
+        return self._chain('values', *fields, **expressions)
+
+    def annotate(self, *args, **kwargs):
+        return self._chain('annotate', *args, **kwargs)
+
+    def all(self):
+        return self
+
+    def order_by(self, *fields):
+        ordered = self._chain('order_by', *fields)
+        ordered.ordering = fields
+        return ordered
+
+    @property
+    def model(self):
+        return self.querysets[0].model
+
+    def _merged(self, stop=None):
+        fields = [f.lstrip('-') for f in self.ordering]
+        reverse = self.ordering[0].startswith('-')
+        tiers = [qs.order_by(*self.ordering) for qs in self.querysets]
+        if stop is not None:
+            tiers = [qs[:stop] for qs in tiers]
+
+        def key(row):
+            if isinstance(row, dict):
+                return tuple(row[f] for f in fields)
+            return tuple(getattr(row, f) for f in fields)
+        return heapq.merge(*tiers, key=key, reverse=reverse)
+
+    def __iter__(self):
+        return iter(self._merged())
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return list(self[item:item + 1])[0]
+        return list(islice(self._merged(item.stop), item.start or 0, item.stop))
+
+    def __len__(self):
+        return self.count()
+
+    def count(self):
+        return sum(qs.count() for qs in self.querysets)
+
+    def exists(self):
+        return any(qs.exists() for qs in self.querysets)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import cached_property
+from rest_framework.permissions import BasePermission
+from rest_framework_simplejwt.models import TokenUser
+
+
+class UserRowCache:
+    """
+    Per-process ``User`` rows kept for ``AUTH_USER_CACHE_SECONDS``. Only read
+    by views that ask for ``request.user.full_user``; saves and deletes in
+    this process evict the entry, other processes wait out the TTL.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        ttl = getattr(settings, 'AUTH_USER_CACHE_SECONDS', 30)
+        now = time.monotonic()
+        entry = self._rows.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        user = User.objects.filter(id=user_id).first()
+        if ttl > 0 and user is not None:
+            with self._lock:
+                if len(self._rows) >= self.max_entries:
+                    self._rows.clear()
+                self._rows[user_id] = (now + ttl, user)
+        return user
+
+    def evict(self, user_id):
+        with self._lock:
+            self._rows.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+user_rows = UserRowCache()
+
+
+def evict_user_row(sender, instance, **kwargs):
+    user_rows.evict(instance.id)
+
+
+post_save.connect(evict_user_row, sender=User, dispatch_uid='auth-user-row-save')
+post_delete.connect(evict_user_row, sender=User, dispatch_uid='auth-user-row-delete')
+
+
+class ClaimsUser(TokenUser):
+    """
+    ``request.user`` built from the claims CustomTokenObtainPairSerializer
+    puts in the token (id, username, email, names, staff flags). Other
+    attributes fall through to the token; ``full_user`` loads the row.
+    """
+
+    @cached_property
+    def id(self):
+        user_id = self.token.get('id', self.token.get('user_id'))
+        return int(user_id) if str(user_id).isdigit() else user_id
+
+    @cached_property
+    def full_user(self):
+        return user_rows.get(self.id)
+
+
+class IsActiveStaff(BasePermission):
+    """
+    IsAdminUser read from the users table instead of the token: claims are
+    frozen at login (TokenUser.is_active is always True), so a deactivated
+    or demoted account is refused once its row changes, here at once and in
+    other processes within AUTH_USER_CACHE_SECONDS.
+    """
+
+    def has_permission(self, request, view):
+        user = getattr(request.user, 'full_user', request.user)
+        return bool(user and user.is_authenticated and user.is_active and user.is_staff)
@@ -0,0 +1,40 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# Full-text index over product name/type, created by migration 0034. SQLite
+# gets an FTS5 table that mirrors api_products through triggers (only
+# name/type updates fire, so stock deductions don't touch it); PostgreSQL
+# gets a GIN index on the same tsvector expression the search uses. The
+# migration keeps its own copy of the DDL, so a change to the names or the
+# expression below needs a new migration.
+SQLITE_FTS_TABLE = 'api_products_fts'
+
+POSTGRES_DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(type, ''))"
+
+TOKEN = re.compile(r'\w+')
+
+
+def search_products(queryset, text):
+    """
+    Narrow ``queryset`` to products whose name or type has a word starting
+    with every word of ``text`` ("choc mil" finds "Chocolate Milk").
+    """
+    tokens = TOKEN.findall(text)
+    if not tokens:
+        return queryset
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s', [match]
+        ))
+    if connection.vendor == 'postgresql':
+        match = ' & '.join(f'{token}:*' for token in tokens)
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT id FROM api_products WHERE {POSTGRES_DOCUMENT} @@ to_tsquery('simple', %s)", [match]
+        ))
+    for token in tokens:
+        queryset = queryset.filter(Q(name__icontains=token) | Q(type__icontains=token))
+    return queryset
@@ -0,0 +1,60 @@
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+
+
+def chat_group_name(user1_id, user2_id):
+    # Rooms are stored with user1 < user2 (see ChatRoomView.post), so the
+    # group is keyed the same way and a socket can join before the room exists.
+    return f"chat_{min(user1_id, user2_id)}_{max(user1_id, user2_id)}"
+
+
+def publish_chat_message(room, message_data):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        chat_group_name(room.user1_id, room.user2_id),
+        {"type": "chat.message", "message": message_data},
+    )
+
+
+def ride_group_name(transportation_id):
+    return f"ride_{transportation_id}"
+
+
+def publish_ride_location(transportation_id, points):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        ride_group_name(transportation_id),
+        {"type": "ride.location", "transportation_id": transportation_id, "points": points},
+    )
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        kwargs = self.scope["url_route"]["kwargs"]
+        self.group_name = chat_group_name(kwargs["user1_id"], kwargs["user2_id"])
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def chat_message(self, event):
+        await self.send_json(event["message"])
+
+
+class RideLocationConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        self.group_name = ride_group_name(self.scope["url_route"]["kwargs"]["transportation_id"])
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def ride_location(self, event):
+        await self.send_json({"transportation_id": event["transportation_id"], "points": event["points"]})
@@ -0,0 +1,152 @@
+from collections import Counter
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, Count, F, Q, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    ArchivedDelivery, ArchivedTransportation, DashboardCounter, Delivery, JobStatus, Profile, Transportation,
+)
+
+# Counted model -> (key prefix, fields its keys are built from). Archived
+# jobs keep counting under their original prefix, so moving a row between
+# tiers leaves the totals alone.
+COUNTED_MODELS = {
+    Delivery: ('deliveries', ('status',)),
+    ArchivedDelivery: ('deliveries', ('status',)),
+    Transportation: ('transportations', ('status', 'date_requested')),
+    ArchivedTransportation: ('transportations', ('status', 'date_requested')),
+    Profile: ('profiles', ('role', 'status')),
+}
+
+RIDER_ROLE = 'Rider'
+
+
+def _day_key(moment):
+    return f"transportations:day:{timezone.localdate(moment).isoformat()}"
+
+
+def counter_keys(instance):
+    """
+    The counters ``instance`` contributes one to, or None if a field they
+    depend on was deferred and reading it would cost a query.
+    """
+    prefix, fields = COUNTED_MODELS[type(instance)]
+    if any(field not in instance.__dict__ for field in fields):
+        return None
+    if prefix == 'profiles':
+        return (f"profiles:{instance.role}:{instance.status}",) if instance.role else ()
+    keys = (f"{prefix}:{instance.status}",)
+    if prefix == 'transportations' and instance.date_requested is not None:
+        keys += (_day_key(instance.date_requested),)
+    return keys
+
+
+def stored_counter_keys(model, pk, for_update=False):
+    """
+    counter_keys() for the row as it is in the database. ``for_update``
+    locks the row until the caller's transaction ends (see CountedModel).
+    """
+    _, fields = COUNTED_MODELS[model]
+    rows = model.objects.filter(pk=pk)
+    if for_update:
+        rows = rows.select_for_update()
+    values = rows.values(*fields).first()
+    return counter_keys(model(pk=pk, **values)) if values else ()
+
+
+def apply_deltas(deltas):
+    """
+    Add every delta in one ``UPDATE ... SET value = value + CASE key ...``;
+    counters that don't exist yet are then created.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    increment = Case(
+        *(When(key=key, then=Value(delta)) for key, delta in deltas.items()),
+        default=Value(0), output_field=BigIntegerField(),
+    )
+    updated = DashboardCounter.objects.filter(key__in=deltas).update(value=F('value') + increment)
+    if updated == len(deltas):
+        return
+    existing = set(DashboardCounter.objects.filter(key__in=deltas).values_list('key', flat=True))
+    for key in deltas.keys() - existing:
+        _, created = DashboardCounter.objects.get_or_create(key=key, defaults={'value': deltas[key]})
+        if not created:
+            DashboardCounter.objects.filter(key=key).update(value=F('value') + deltas[key])
+
+
+def move_keys(old_keys, new_keys):
+    deltas = Counter(new_keys)
+    deltas.subtract(old_keys)
+    apply_deltas(deltas)
+
+
+def count_created(instances):
+    """Count rows written without save() signals, e.g. by bulk_create()."""
+    deltas = Counter()
+    for instance in instances:
+        deltas.update(counter_keys(instance) or ())
+    apply_deltas(deltas)
+
+
+def count_status_change(model, old_status, new_status):
+    """Move one row between status counters after a queryset update()."""
+    if old_status != new_status:
+        prefix, _ = COUNTED_MODELS[model]
+        apply_deltas({f"{prefix}:{old_status}": -1, f"{prefix}:{new_status}": 1})
+
+
+def dashboard_counts():
+    """The admin dashboard numbers, read in one query."""
+    today = _day_key(timezone.now())
+    rows = DashboardCounter.objects.filter(~Q(key__startswith='transportations:day:') | Q(key=today))
+    stats = {
+        'deliveries': dict.fromkeys(JobStatus.values, 0),
+        'transportations': dict.fromkeys(JobStatus.values, 0),
+        'rides_today': 0,
+        'riders': {},
+    }
+    for key, value in rows.values_list('key', 'value'):
+        if key == today:
+            stats['rides_today'] = value
+            continue
+        prefix, _, rest = key.partition(':')
+        if prefix == 'profiles':
+            role, _, status = rest.partition(':')
+            if role == RIDER_ROLE and value:
+                stats['riders'][status] = value
+        else:
+            stats[prefix][rest] = value
+    return stats
+
+
+def rebuild_counters(apps=global_apps):
+    """
+    Recount everything from the tables. Used to seed the counters and to
+    repair them after writes that bypassed the ORM (raw SQL, shell fixes).
+    """
+    deltas = Counter()
+    for model, (prefix, _) in COUNTED_MODELS.items():
+        model = apps.get_model(model._meta.app_label, model._meta.model_name)
+        if prefix == 'profiles':
+            rows = model.objects.exclude(role__isnull=True).exclude(role='').values('role', 'status')
+            for row in rows.annotate(n=Count('id')).order_by():
+                deltas[f"profiles:{row['role']}:{row['status']}"] += row['n']
+            continue
+        for row in model.objects.values('status').annotate(n=Count('id')).order_by():
+            deltas[f"{prefix}:{row['status']}"] += row['n']
+        if prefix == 'transportations':
+            days = model.objects.values(day=TruncDate('date_requested')).annotate(n=Count('id')).order_by()
+            for row in days:
+                deltas[f"transportations:day:{row['day'].isoformat()}"] += row['n']
+
+    counter_model = apps.get_model('api', 'DashboardCounter')
+    with transaction.atomic():
+        counter_model.objects.all().delete()
+        counter_model.objects.bulk_create(
+            counter_model(key=key, value=value) for key, value in deltas.items() if value
+        )
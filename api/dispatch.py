@@ -0,0 +1,178 @@
+import math
+import threading
+
+from django.conf import settings
+from django.db.models import Q
+
+from .geo import KM_PER_DEGREE, haversine_km
+from .models import JobStatus
+from .versions import bump_model_version
+
+# Statuses that free the job's rider for dispatch again.
+JOB_OVER = {JobStatus.ARRIVED, JobStatus.RECEIVED, JobStatus.CANCELLED}
+
+
+class RiderIndex:
+    """
+    Idle riders bucketed into a lat/lng grid. A nearest-rider query walks
+    rings of cells outwards from the pickup and stops once no unvisited cell
+    can hold anything closer than the k-th rider found, so it only looks at
+    riders near the pickup however many are online.
+
+    A rider given a job (``assign``) leaves the pool and their position
+    updates are ignored until the job is released at a JOB_OVER status.
+    Jobs store the rider's name, so busy riders are tracked by name.
+    """
+
+    def __init__(self, cell_degrees=0.01):
+        self.cell_degrees = cell_degrees
+        self._riders = {}   # rider_id -> (lat, lng, name, cell)
+        self._cells = {}    # cell -> set of rider ids
+        self._ids = {}      # name -> rider_id, as last reported
+        self._busy = {}     # name -> job key
+        self._jobs = {}     # job key -> name
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._riders)
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def get(self, rider_id):
+        return self._riders.get(rider_id)
+
+    def is_busy(self, name):
+        return name in self._busy
+
+    def update(self, rider_id, lat, lng, name):
+        """Add or move an idle rider; returns False (and does nothing) while they're busy."""
+        cell = self._cell(lat, lng)
+        with self._lock:
+            self._ids[name] = rider_id
+            if name in self._busy:
+                return False
+            previous = self._riders.get(rider_id)
+            if previous is not None and previous[3] != cell:
+                self._discard_from_cell(rider_id, previous[3])
+            self._riders[rider_id] = (lat, lng, name, cell)
+            self._cells.setdefault(cell, set()).add(rider_id)
+        return True
+
+    def remove(self, rider_id):
+        """Take a rider out of the idle pool; returns their entry or None if already gone."""
+        with self._lock:
+            entry = self._riders.pop(rider_id, None)
+            if entry is not None:
+                self._discard_from_cell(rider_id, entry[3])
+        return entry
+
+    def assign(self, name, job):
+        """Mark ``name`` busy with ``job`` (see ``job_key``) and take them out of the pool."""
+        with self._lock:
+            previous = self._jobs.get(job)
+            if previous is not None and previous != name:
+                self._busy.pop(previous, None)  # reassigned
+            self._busy[name] = job
+            self._jobs[job] = name
+            rider_id = self._ids.get(name)
+            entry = self._riders.pop(rider_id, None)
+            if entry is not None:
+                self._discard_from_cell(rider_id, entry[3])
+
+    def release(self, job):
+        """The job is over; its rider's next position update puts them back in the pool."""
+        with self._lock:
+            name = self._jobs.pop(job, None)
+            if name is not None and self._busy.get(name) == job:
+                del self._busy[name]
+
+    def clear(self):
+        with self._lock:
+            for store in (self._riders, self._cells, self._ids, self._busy, self._jobs):
+                store.clear()
+
+    def _discard_from_cell(self, rider_id, cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(rider_id)
+            if not bucket:
+                del self._cells[cell]
+
+    def nearest(self, lat, lng, k=5, max_km=15):
+        """Up to ``k`` ``(distance_km, rider_id, name)`` tuples within ``max_km``, closest first."""
+        ci, cj = self._cell(lat, lng)
+        # Smallest ground width of one cell around here (longitude shrinks with latitude).
+        cell_km = self.cell_degrees * KM_PER_DEGREE * math.cos(math.radians(min(abs(lat) + self.cell_degrees, 89.9)))
+        max_ring = math.ceil(max_km / cell_km) + 1
+        found = []
+        with self._lock:
+            for ring in range(max_ring + 1):
+                for cell in self._ring_cells(ci, cj, ring):
+                    for rider_id in self._cells.get(cell, ()):
+                        r_lat, r_lng, name, _ = self._riders[rider_id]
+                        distance = haversine_km(lat, lng, r_lat, r_lng)
+                        if distance <= max_km:
+                            found.append((distance, rider_id, name))
+                # Anything in ring + 1 or further is at least ring * cell_km away.
+                if len(found) >= k:
+                    found.sort()
+                    if found[k - 1][0] <= ring * cell_km:
+                        break
+        found.sort()
+        return found[:k]
+
+    @staticmethod
+    def _ring_cells(ci, cj, ring):
+        if ring == 0:
+            yield ci, cj
+            return
+        for dj in range(-ring, ring + 1):
+            yield ci - ring, cj + dj
+            yield ci + ring, cj + dj
+        for di in range(-ring + 1, ring):
+            yield ci + di, cj - ring
+            yield ci + di, cj + ring
+
+
+rider_index = RiderIndex(getattr(settings, 'DISPATCH_CELL_DEGREES', 0.01))
+
+
+def job_key(model, job_id):
+    return model._meta.label_lower, job_id
+
+
+def track_assignment(model, job_id, rider, status):
+    """Keep the index's busy riders in step with a job's rider and status."""
+    key = job_key(model, job_id)
+    if rider and status not in JOB_OVER:
+        rider_index.assign(rider, key)
+    else:
+        rider_index.release(key)
+
+
+def dispatch_job(model, job_id, lat, lng, index=None):
+    """
+    Give an unassigned Delivery/Transportation to the nearest idle rider.
+    Each candidate is taken out of the idle pool before the conditional
+    UPDATE, so concurrent jobs never get the same rider. Returns the rider's
+    name, or None if nobody idle is in range or the job was already taken.
+    """
+    index = index or rider_index
+    candidates = index.nearest(
+        lat, lng,
+        k=getattr(settings, 'DISPATCH_CANDIDATES', 5),
+        max_km=getattr(settings, 'DISPATCH_MAX_KM', 15),
+    )
+    for _, rider_id, name in candidates:
+        entry = index.remove(rider_id)
+        if entry is None:
+            continue  # claimed by a concurrent dispatch
+        unassigned = Q(rider__isnull=True) | Q(rider='')
+        if model.objects.filter(unassigned, id=job_id).update(rider=name):
+            bump_model_version(model)
+            index.assign(name, job_key(model, job_id))
+            return name
+        index.update(rider_id, entry[0], entry[1], entry[2])
+        return None
+    return None
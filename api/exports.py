@@ -0,0 +1,106 @@
+import csv
+import heapq
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import ArchivedDelivery, ArchivedTransportation, Delivery, Transportation
+
+# Export name -> (hot model, archive model, date column, [(header, lookup)])
+EXPORTS = {
+    'deliveries': (Delivery, ArchivedDelivery, 'delivery_issued', [
+        ('id', 'id'),
+        ('delivery_issued', 'delivery_issued'),
+        ('status', 'status'),
+        ('customer_id', 'customer_id'),
+        ('customer', 'customer__first_name'),
+        ('rider', 'rider'),
+        ('product_id', 'products_id'),
+        ('product', 'products__name'),
+        ('quantity', 'quantity'),
+        ('price', 'price'),
+        ('location', 'location'),
+    ]),
+    'transportations': (Transportation, ArchivedTransportation, 'date_requested', [
+        ('id', 'id'),
+        ('date_requested', 'date_requested'),
+        ('status', 'status'),
+        ('customer_id', 'customer_id'),
+        ('customer', 'customer__first_name'),
+        ('rider', 'rider'),
+        ('passenger', 'passenger'),
+        ('current_location', 'current_location'),
+        ('destination', 'destination'),
+        ('price', 'price'),
+    ]),
+}
+
+CHUNK_SIZE = 2000
+
+
+def export_rows(name, filters):
+    """
+    Flat tuples for every hot and archived row matching ``filters`` (start,
+    end, status), in id order. Both tiers are read with server-side
+    iterators and merged lazily, so memory stays flat however many rows
+    match.
+    """
+    model, archive_model, date_field, columns = EXPORTS[name]
+    lookups = [lookup for _, lookup in columns]
+    tiers = []
+    for tier_model in (model, archive_model):
+        queryset = tier_model.objects.order_by('id')
+        if 'start' in filters:
+            queryset = queryset.filter(**{f'{date_field}__date__gte': filters['start']})
+        if 'end' in filters:
+            queryset = queryset.filter(**{f'{date_field}__date__lte': filters['end']})
+        if 'status' in filters:
+            queryset = queryset.filter(status=filters['status'])
+        tiers.append(queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE))
+    return heapq.merge(*tiers, key=lambda row: row[0])
+
+
+def headers(name):
+    return [header for header, _ in EXPORTS[name][3]]
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(name, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers(name))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(name, rows):
+    keys = headers(name)
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(keys, row))) + '\n'
+
+
+def batched(lines, size=None):
+    """Join ``size`` (CHUNK_SIZE) lines per chunk so each write to the socket is worth it."""
+    size = size or CHUNK_SIZE
+    while batch := list(islice(lines, size)):
+        yield ''.join(batch)
+
+
+async def abatched(lines, size=None):
+    """
+    batched() for ASGI. Django only streams async iterators there (a sync
+    one is read to the end first), so each batch, and the database read
+    behind it, runs in the request's sync thread and is sent before the
+    next.
+    """
+    size = size or CHUNK_SIZE
+    next_batch = sync_to_async(lambda: list(islice(lines, size)), thread_sensitive=True)
+    while batch := await next_batch():
+        yield ''.join(batch)
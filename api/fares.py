@@ -0,0 +1,97 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import EARTH_RADIUS_KM
+from .roads import get_road_graph, road_route
+
+# Quotes are cached per (origin cell, destination cell); 3 decimals of a
+# degree is ~110 m, well inside what a fare can tell apart.
+CELL_DECIMALS = 3
+CACHE_TIMEOUT = 60 * 60
+
+
+def haversine_pairs(origins, destinations):
+    """Great-circle km between origins[i] and destinations[i]; both (n, 2) lat/lng arrays."""
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+    dlat = destinations[:, 0] - origins[:, 0]
+    dlng = destinations[:, 1] - origins[:, 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(origins[:, 0]) * np.cos(destinations[:, 0]) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(origins, destinations):
+    """(n, m) great-circle km from every origin to every destination, e.g. riders x requests."""
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+    lat1, lng1 = origins[:, 0:1], origins[:, 1:2]
+    lat2, lng2 = destinations[:, 0], destinations[:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def tariff():
+    return (
+        float(getattr(settings, 'FARE_BASE', 20)),
+        float(getattr(settings, 'FARE_PER_KM', 10)),
+        float(getattr(settings, 'FARE_MINIMUM', 20)),
+    )
+
+
+def fares_for_distances(distances_km):
+    base, per_km, minimum = tariff()
+    return np.maximum(base + per_km * np.asarray(distances_km, dtype=float), minimum)
+
+
+def _cell(point):
+    return round(point[0], CELL_DECIMALS), round(point[1], CELL_DECIMALS)
+
+
+def _cache_key(origin_cell, destination_cell, mode):
+    # Tariff and distance mode are part of the key so neither a fare change
+    # nor turning road routing on ever serves old quotes.
+    return 'fare:%s:%s:%s:%s:%s,%s:%s,%s' % (mode, *tariff(), *origin_cell, *destination_cell)
+
+
+def _money(value):
+    # Same "12.50" string the price fields serialize to.
+    return Decimal(repr(float(value))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def quote_trips(trips):
+    """
+    Fare quotes for ``[((lat, lng), (lat, lng)), ...]``. Cached cells are read
+    with one get_many; everything else is computed in a single vectorized
+    pass and written back with one set_many. With a road graph configured the
+    distance is the road distance, falling back to straight-line for trips
+    that can't be routed.
+    """
+    graph = get_road_graph()
+    # A different road file must not be answered with the old one's quotes.
+    mode = f'road-{graph.fingerprint}' if graph is not None else 'line'
+    cells = [(_cell(origin), _cell(destination)) for origin, destination in trips]
+    keys = [_cache_key(*pair, mode) for pair in cells]
+    cached = cache.get_many(keys)
+
+    missing = sorted({key: pair for key, pair in zip(keys, cells) if key not in cached}.items())
+    if missing:
+        origins = [pair[0] for _, pair in missing]
+        destinations = [pair[1] for _, pair in missing]
+        distances = haversine_pairs(origins, destinations)
+        if graph is not None:
+            for i, (origin, destination) in enumerate(zip(origins, destinations)):
+                route = road_route(origin, destination)
+                if route is not None:
+                    distances[i] = route['distance_km']
+        fares = fares_for_distances(distances)
+        fresh = {
+            key: {'distance_km': round(float(distance), 3), 'fare': str(_money(fare))}
+            for (key, _), distance, fare in zip(missing, distances, fares)
+        }
+        cache.set_many(fresh, CACHE_TIMEOUT)
+        cached.update(fresh)
+
+    return [cached[key] for key in keys]
@@ -0,0 +1,112 @@
+import threading
+import time
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Resized copies served to list screens instead of phone-camera originals.
+VARIANTS = {
+    'thumbnail': {'size': (320, 320), 'format': 'JPEG', 'ext': 'jpg', 'quality': 75},
+    'medium': {'size': (1024, 1024), 'format': 'JPEG', 'ext': 'jpg', 'quality': 80},
+    'webp': {'size': (1024, 1024), 'format': 'WEBP', 'ext': 'webp', 'quality': 75},
+}
+
+# How long a process trusts what it learned about a variant before asking
+# the storage again.
+STATE_TTL = 300
+PRESENT, MISSING, FAILED = 'present', 'missing', 'failed'
+
+
+def variant_name(name, variant):
+    # Keep the source extension: x.png and x.jpg get different variants.
+    return f"variants/{variant}/{name}.{VARIANTS[variant]['ext']}"
+
+
+def render_variant(fieldfile, variant):
+    spec = VARIANTS[variant]
+    with fieldfile.storage.open(fieldfile.name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(spec['size'])
+        image = image.convert('RGBA')
+        if spec['format'] == 'JPEG':
+            # JPEG has no alpha; flatten transparent PNGs onto white.
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        buffer = BytesIO()
+        image.save(buffer, format=spec['format'], quality=spec['quality'], optimize=True)
+    return buffer.getvalue()
+
+
+class VariantState:
+    """Per-process memo of which variant files exist, with a short TTL."""
+
+    def __init__(self, ttl=STATE_TTL, max_entries=50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def set(self, name, state):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[name] = (time.monotonic() + self.ttl, state)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+variant_state = VariantState()
+
+
+def render_variants(fieldfile):
+    """
+    Write every variant of an uploaded image that isn't stored yet. Called
+    when the image is saved (see api/signals.py) and by the
+    render_image_variants command; list requests never render.
+    """
+    storage = fieldfile.storage
+    for variant in VARIANTS:
+        name = variant_name(fieldfile.name, variant)
+        if variant_state.get(name) in (PRESENT, FAILED):
+            continue
+        if storage.exists(name):
+            variant_state.set(name, PRESENT)
+            continue
+        try:
+            content = render_variant(fieldfile, variant)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            variant_state.set(name, FAILED)  # don't retry a broken original
+            continue
+        saved = storage.save(name, ContentFile(content))
+        if saved != name:
+            # Another worker stored it first; ours got a suffixed name.
+            storage.delete(saved)
+        variant_state.set(name, PRESENT)
+
+
+def variant_urls(fieldfile):
+    """
+    ``{variant: url or None}`` for an image. Existence is read from the
+    per-process memo, so a list page costs no storage calls once warm.
+    """
+    storage = fieldfile.storage
+    urls = {}
+    for variant in VARIANTS:
+        name = variant_name(fieldfile.name, variant)
+        state = variant_state.get(name)
+        if state is None:
+            state = PRESENT if storage.exists(name) else MISSING
+            variant_state.set(name, state)
+        urls[variant] = storage.url(name) if state == PRESENT else None
+    return urls
@@ -0,0 +1,70 @@
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Least
+
+from .models import Message, Room
+
+PREVIEW_LENGTH = Room._meta.get_field('last_message_preview').max_length
+
+
+def record_message(room, message):
+    """
+    Make ``message`` the room's last message and mark it read for its
+    sender. The id check keeps a slower concurrent post from winning.
+    """
+    read_field = 'user1_last_read' if message.sender_id == room.user1_id else 'user2_last_read'
+    Room.objects.filter(Q(last_message__isnull=True) | Q(last_message_id__lt=message.id), id=room.id).update(
+        last_message=message,
+        last_sender_id=message.sender_id,
+        last_message_preview=message.content[:PREVIEW_LENGTH],
+        last_message_at=message.timestamp,
+    )
+    Room.objects.filter(id=room.id, **{f'{read_field}__lt': message.id}).update(**{read_field: message.id})
+
+
+def mark_read(room, user_id, up_to=None):
+    """
+    Move ``user_id``'s read marker forward to message ``up_to`` (default:
+    the room's last message). Markers never move backwards or past the
+    room's last message; raises Message.DoesNotExist if ``up_to`` isn't a
+    message of this room.
+    """
+    read_field = 'user1_last_read' if user_id == room.user1_id else 'user2_last_read'
+    if up_to is None:
+        up_to = room.last_message_id
+    elif not Message.objects.filter(room=room, id=up_to).exists():
+        raise Message.DoesNotExist
+    if up_to:
+        target = Least(Value(up_to), F('last_message_id'))
+        Room.objects.filter(id=room.id, last_message__isnull=False, **{f'{read_field}__lt': target}).update(
+            **{read_field: target}
+        )
+
+
+def inbox(user_id):
+    """
+    ``user_id``'s rooms, newest activity first, each with both users joined
+    and ``unread`` (messages from the partner past the user's read marker)
+    computed by a correlated count over the (room, id) index: one query.
+    The last message is read from the room's denormalized columns, never
+    from the messages table.
+    """
+    unread = (
+        Message.objects.filter(room=OuterRef('pk'), id__gt=OuterRef('my_last_read'))
+        .exclude(sender_id=user_id)
+        .order_by()
+        .values('room')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    return (
+        Room.objects.filter(Q(user1_id=user_id) | Q(user2_id=user_id))
+        .select_related('user1', 'user2')
+        .annotate(
+            my_last_read=Case(
+                When(user1_id=user_id, then=F('user1_last_read')),
+                default=F('user2_last_read'),
+            ),
+            unread=Coalesce(Subquery(unread, output_field=IntegerField()), 0),
+        )
+        .order_by(F('last_message_at').desc(nulls_last=True), '-id')
+    )
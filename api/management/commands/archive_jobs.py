@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.archive import ARCHIVES, ArchiveConflict, archive_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves Arrived deliveries and rides created more than --days ago into the "
+        "archive tables, --batch-size rows per transaction. Safe to run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ARCHIVE_AFTER_DAYS', 30))
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        for model in ARCHIVES:
+            moved = 0
+            while True:
+                try:
+                    count = archive_batch(model, cutoff, options['batch_size'])
+                except ArchiveConflict as e:
+                    raise CommandError(f"{e}; nothing in that batch was moved") from e
+                if not count:
+                    break
+                moved += count
+            self.stdout.write(f"{model.__name__}: archived {moved} rows created before {cutoff:%Y-%m-%d}")
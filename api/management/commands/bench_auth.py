@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+
+from api.views import CustomTokenObtainPairSerializer
+
+BENCH_USERNAME = 'bench-auth'
+
+
+class Command(BaseCommand):
+    help = (
+        "Times --requests JWT authentications with the row-loading JWTAuthentication "
+        "and with the claims-only JWTStatelessUserAuthentication, and counts the "
+        "queries each makes. Uses a scratch user that is removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        user = User.objects.create(username=BENCH_USERNAME, first_name='Bench')
+        try:
+            token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+            request = Request(APIRequestFactory().get('/api/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+            self.stdout.write(f"backend: {connection.vendor}, requests: {options['requests']}")
+            for auth_class in (JWTAuthentication, JWTStatelessUserAuthentication):
+                self.run(auth_class(), request, options['requests'])
+        finally:
+            user.delete()
+
+    def run(self, auth, request, count):
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(count):
+                start = time.perf_counter()
+                authed_user, _ = auth.authenticate(request)
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        self.stdout.write(
+            f"{type(auth).__name__}: {len(queries) / count:.1f} queries/request, "
+            f"median {statistics.median(latencies) * 1e6:.0f} us, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1e6:.0f} us, "
+            f"user {authed_user.id} ({type(authed_user).__name__})"
+        )
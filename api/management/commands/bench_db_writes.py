@@ -0,0 +1,67 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+
+from api.models import ResourceVersion
+from api.versions import bump_version
+
+BENCH_KEY = 'bench-db-writes'
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent-write benchmark for the configured database profile. "
+        "Threads hammer a scratch ResourceVersion row (the same hot-row update "
+        "chat posts and status changes do) and report throughput, latency and "
+        "lock errors. The scratch row is removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200, help='writes per thread')
+
+    def handle(self, *args, **options):
+        threads, writes = options['threads'], options['writes']
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(_):
+            local, failed = [], []
+            try:
+                for _ in range(writes):
+                    start = time.perf_counter()
+                    try:
+                        bump_version(BENCH_KEY)
+                    except OperationalError as e:
+                        failed.append(str(e))
+                        continue
+                    local.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(local)
+                errors.extend(failed)
+
+        vendor = connection.vendor
+        ResourceVersion.objects.filter(key=BENCH_KEY).delete()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+        elapsed = time.perf_counter() - started
+        final = ResourceVersion.objects.filter(key=BENCH_KEY).values_list('version', flat=True).first() or 0
+        ResourceVersion.objects.filter(key=BENCH_KEY).delete()
+
+        self.stdout.write(f"backend: {vendor}, threads: {threads}, writes/thread: {writes}")
+        self.stdout.write(f"committed: {final} of {threads * writes}, lock errors: {len(errors)}")
+        self.stdout.write(f"throughput: {len(latencies) / elapsed:.0f} writes/s over {elapsed:.2f}s")
+        if latencies:
+            latencies.sort()
+            self.stdout.write(
+                f"latency ms: median {statistics.median(latencies) * 1000:.2f}, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}"
+            )
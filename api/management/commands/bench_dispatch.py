@@ -0,0 +1,53 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.dispatch import RiderIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the in-memory rider index: loads --riders idle riders around "
+        "a centre point and times --queries nearest-rider lookups (no database)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--riders', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--spread-km', type=float, default=15.0)
+        parser.add_argument('--center', default='7.7372,123.3259')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        lat0, lng0 = (float(v) for v in options['center'].split(','))
+        spread = options['spread_km'] / 111.0
+
+        def point():
+            return lat0 + rng.uniform(-spread, spread), lng0 + rng.uniform(-spread, spread)
+
+        index = RiderIndex()
+        started = time.perf_counter()
+        for rider_id in range(options['riders']):
+            index.update(rider_id, *point(), f'rider{rider_id}')
+        load_s = time.perf_counter() - started
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(options['queries']):
+            q_start = time.perf_counter()
+            index.nearest(*point(), k=options['k'])
+            latencies.append(time.perf_counter() - q_start)
+        total_s = time.perf_counter() - started
+
+        latencies.sort()
+        self.stdout.write(f"riders: {len(index)} loaded in {load_s * 1000:.1f} ms")
+        self.stdout.write(
+            f"{options['queries']} nearest(k={options['k']}) queries: "
+            f"{options['queries'] / total_s:.0f} queries/s, "
+            f"median {statistics.median(latencies) * 1000:.3f} ms, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.3f} ms"
+        )
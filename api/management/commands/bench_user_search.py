@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from api.search import index_users, search_users
+
+BENCH_PREFIX = 'bench-search-'
+NAMES = [
+    'Ana', 'Angelo', 'Andres', 'Bea', 'Ben', 'Carlo', 'Clara', 'Dan', 'Elena', 'Jose', 'Joy', 'Juan',
+    'Kristine', 'Liza', 'Mae', 'Maria', 'Marco', 'Nina', 'Paolo', 'Rosa', 'Ramon', 'Sofia', 'Tomas',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads --users scratch users with random one- or two-word first names, "
+        "times --queries type-ahead searches for 1-4 letter prefixes and removes "
+        "the users afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+        started = time.perf_counter()
+        for offset in range(0, options['users'], 5000):
+            users = User.objects.bulk_create(
+                User(
+                    username=f'{BENCH_PREFIX}{n:07d}',
+                    first_name=' '.join(rng.sample(NAMES, rng.choice((1, 2)))) + f' {n}',
+                )
+                for n in range(offset, min(offset + 5000, options['users']))
+            )
+            index_users(users)
+        self.stdout.write(f"indexed {options['users']} users in {time.perf_counter() - started:.1f} s")
+
+        try:
+            latencies = []
+            for _ in range(options['queries']):
+                name = rng.choice(NAMES).lower()
+                query = name[:rng.randint(1, min(4, len(name)))]
+                start = time.perf_counter()
+                results = search_users(query, options['limit'])
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            self.stdout.write(
+                f"{options['queries']} searches (top {options['limit']}): "
+                f"median {statistics.median(latencies) * 1000:.2f} ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms, "
+                f"last '{query}' -> {[r['first_name'] for r in results[:3]]}"
+            )
+        finally:
+            User.objects.filter(username__startswith=BENCH_PREFIX).delete()
@@ -0,0 +1,122 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.http import Http404
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+
+from api import views
+from api.archive import TieredQuerySet
+from api.models import Message, Transportation, UserSearchTerm
+from api.search import MAX_CHAR
+
+# (label, view class, url kwargs, query params) for the list views whose
+# querysets are checked in keyset-paginated form.
+LIST_VIEWS = [
+    ('DeliveryListView', views.DeliveryListView, {}, {}),
+    ('UserDeliveriesView', views.UserDeliveriesView, {'user_id': 1}, {}),
+    ('ArrivedDeliveryListView', views.ArrivedDeliveryListView, {}, {}),
+    ('TransportationListView', views.TransportationListView, {}, {}),
+    ('CustomerTransportationListView', views.CustomerTransportationListView, {'customer_id': 1}, {}),
+    ('ArrivedTransportationListView', views.ArrivedTransportationListView, {}, {}),
+    ('ProductListView', views.ProductListView, {}, {}),
+    ('ProductListView (search)', views.ProductListView, {}, {'q': 'milk'}),
+    ('ProductListView (type)', views.ProductListView, {}, {'type': 'Drinks', 'in_stock': 'true'}),
+    ('RidersListView', views.RidersListView, {}, {}),
+    ('ClientsListView', views.ClientsListView, {}, {'role': 'Rider'}),
+    ('ProfileByRoleView', views.ProfileByRoleView, {'role': 'Rider'}, {}),
+]
+
+# Index-less scans; FTS5 MATCH lookups show up as "SCAN <table> VIRTUAL TABLE INDEX".
+FULL_SCAN = re.compile(r'^SCAN \w+\b(?! USING| VIRTUAL TABLE INDEX)')
+
+
+# URL kwargs naming a user the view looks up before building its queryset.
+SAMPLE_USER_KWARGS = ('user_id', 'customer_id')
+
+
+def seed_sample_users():
+    """Create the users LIST_VIEWS look up, so no view 404s on an empty database."""
+    ids = {kwargs[key] for _, _, kwargs, _ in LIST_VIEWS for key in SAMPLE_USER_KWARGS if key in kwargs}
+    existing = set(User.objects.filter(id__in=ids).values_list('id', flat=True))
+    User.objects.bulk_create([User(id=pk, username=f'query-plan-sample-{pk}') for pk in sorted(ids - existing)])
+
+
+def keyset_page(view_class, kwargs, params):
+    """
+    The querysets a view runs for one cursor page, as OptInCursorPagination
+    builds them: one per tier for views that also read the archive tables.
+    """
+    request = Request(RequestFactory().get('/', params))
+    view = view_class(request=request, kwargs=kwargs, format_kwarg=None)
+    queryset = view.filter_queryset(view.get_queryset())
+    paginator = view.paginator
+    ordering = paginator.get_ordering(request, queryset, view)
+    field = ordering[0].lstrip('-')
+    position = timezone.now() if field.startswith('date') else 1
+    lookup = f'{field}__lt' if ordering[0].startswith('-') else f'{field}__gt'
+    tiers = queryset.querysets if isinstance(queryset, TieredQuerySet) else [queryset]
+    return [qs.order_by(*ordering).filter(**{lookup: position})[:paginator.page_size] for qs in tiers]
+
+
+def lookup_querysets():
+    """Querysets run by the non-list views, mirrored from api/views.py."""
+    return [
+        ('ChatUserView', User.objects.annotate(first_name_lower=Lower('first_name')).filter(
+            first_name_lower=Lower(Value('ana'))).values('id', 'first_name', 'username')),
+        ('UpdateTransportView', User.objects.filter(first_name='Ana')),
+        ('ChatRoomView (after_id)', Message.objects.filter(room_id=1, id__gt=1).select_related('sender').order_by('id')[:50]),
+        ('ChatRoomView (before_id)', Message.objects.filter(room_id=1, id__lt=100).select_related('sender').order_by('-id')[:50]),
+        ('RiderLocationView', Transportation.objects.filter(id=1).exclude(status='Arrived')),
+        ('UserSearchView', UserSearchTerm.objects.filter(term__gte='ma', term__lt='ma' + MAX_CHAR).order_by('term')[:200]),
+    ]
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN QUERY PLAN for the querysets behind the hot views and fails "
+        "if any of them falls back to a full table scan or sorts the whole table."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans reads SQLite EXPLAIN QUERY PLAN output; run it with DB_PROFILE=sqlite.')
+
+        failures = []
+        with transaction.atomic():
+            # Sample rows are rolled back with the rest of the check.
+            seed_sample_users()
+            checks = []
+            for label, view_class, kwargs, params in LIST_VIEWS:
+                try:
+                    for tier in keyset_page(view_class, kwargs, params):
+                        checks.append((f'{label} [{tier.model._meta.db_table}]', tier))
+                except Http404:
+                    # A view that can't be planned must not pass unnoticed.
+                    self.stdout.write(f"FAIL {label}: no sample row for {kwargs}")
+                    failures.append(f"{label}: not checked, no sample row for {kwargs}")
+            checks += lookup_querysets()
+
+            for label, queryset in checks:
+                plan = query_plan(queryset)
+                bad = [step for step in plan if FULL_SCAN.match(step) or 'TEMP B-TREE' in step]
+                status = 'FAIL' if bad else 'ok'
+                self.stdout.write(f"{status:4} {label}: {' | '.join(plan)}")
+                if bad:
+                    failures.append(f"{label}: {', '.join(bad)}")
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError('Query plan check failed:\n' + '\n'.join(failures))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.onboarding import DEFAULT_ROLE, import_users, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Registers riders/customers from a CSV with a header row (username, password, "
+        "and optionally first_name, email, role). Rows are streamed and inserted "
+        "--chunk-size at a time; passwords are hashed across --workers processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help='hashing processes (default: CPU count)')
+        parser.add_argument('--role', default=DEFAULT_ROLE, help='role for rows that leave it blank')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_path'], newline='', encoding='utf-8-sig') as stream:
+                report = import_users(
+                    read_rows(stream),
+                    chunk_size=options['chunk_size'],
+                    workers=options['workers'],
+                    default_role=options['role'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for duplicate in report['duplicates']:
+            self.stdout.write(f"line {duplicate['line']}: {duplicate['username']} is already registered")
+        for invalid in report['invalid']:
+            self.stdout.write(f"line {invalid['line']}: {invalid['error']}")
+        self.stdout.write(
+            f"created {report['created']} users, skipped {len(report['duplicates'])} duplicates "
+            f"and {len(report['invalid'])} invalid rows"
+        )
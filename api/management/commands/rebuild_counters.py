@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.counters import dashboard_counts, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recounts the dashboard counters from the job and profile tables. Run it "
+        "after bulk edits made outside the ORM (raw SQL, imports)."
+    )
+
+    def handle(self, *args, **options):
+        rebuild_counters()
+        stats = dashboard_counts()
+        self.stdout.write(
+            f"deliveries: {sum(stats['deliveries'].values())}, "
+            f"transportations: {sum(stats['transportations'].values())}, "
+            f"rides today: {stats['rides_today']}, riders: {sum(stats['riders'].values())}"
+        )
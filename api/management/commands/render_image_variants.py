@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.signals import IMAGE_FIELDS
+from api.images import render_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the missing thumbnail/medium/webp variants of every stored image. "
+        "Uploads render their own variants; run this once for images uploaded "
+        "before that, or after clearing media/variants/."
+    )
+
+    def handle(self, *args, **options):
+        for model, fields in IMAGE_FIELDS.items():
+            count = 0
+            for field in fields:
+                queryset = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                for fieldfile in (getattr(obj, field) for obj in queryset.only('id', field).iterator()):
+                    render_variants(fieldfile)
+                    count += 1
+            self.stdout.write(f"{model.__name__}: checked {count} images")
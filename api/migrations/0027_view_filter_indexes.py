@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_resourceversion'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['status', 'id'], name='delivery_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['customer', 'id'], name='delivery_customer_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role'], name='profile_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transportation',
+            index=models.Index(fields=['date_requested'], name='transport_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transportation',
+            index=models.Index(fields=['status', 'date_requested'], name='transport_status_req_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transportation',
+            index=models.Index(fields=['customer', 'id'], name='transport_customer_id_idx'),
+        ),
+        # auth_user belongs to django.contrib.auth, so its indexes are plain SQL:
+        # exact first-name lookups (UpdateTransportView) and case-insensitive
+        # ones (ChatUserView filters on LOWER(first_name)).
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_first_name_idx ON auth_user (first_name)',
+            'DROP INDEX IF EXISTS auth_user_first_name_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_first_name_lower_idx ON auth_user (LOWER(first_name))',
+            'DROP INDEX IF EXISTS auth_user_first_name_lower_idx',
+        ),
+    ]
@@ -0,0 +1,64 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+PRICED_MODELS = ['products', 'delivery', 'transportation']
+MAX_PRICE = Decimal('99999999.99')
+
+
+def parse_price(text):
+    """
+    '₱1,299' / '1299 pesos' / ' 22 ' -> Decimal; anything unreadable,
+    negative or too large -> None.
+    """
+    if text is None:
+        return None
+    cleaned = re.sub(r'[^\d.-]', '', str(text))
+    try:
+        value = Decimal(cleaned).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    return value if 0 <= value <= MAX_PRICE else None
+
+
+def copy_prices(apps, schema_editor):
+    for model_name in PRICED_MODELS:
+        model = apps.get_model('api', model_name)
+        rows = model.objects.exclude(price__isnull=True).values_list('id', 'price')
+        for pk, text in rows.iterator():
+            model.objects.filter(pk=pk).update(price_decimal=parse_price(text))
+
+
+def copy_prices_back(apps, schema_editor):
+    for model_name in PRICED_MODELS:
+        model = apps.get_model('api', model_name)
+        for pk, value in model.objects.exclude(price_decimal__isnull=True).values_list('id', 'price_decimal').iterator():
+            model.objects.filter(pk=pk).update(price=f'{value.normalize():f}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_view_filter_indexes'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='price_decimal',
+                field=models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True),
+            )
+            for model_name in PRICED_MODELS
+        ],
+        migrations.RunPython(copy_prices, copy_prices_back),
+        *[
+            migrations.RemoveField(model_name=model_name, name='price')
+            for model_name in PRICED_MODELS
+        ],
+        *[
+            migrations.RenameField(model_name=model_name, old_name='price_decimal', new_name='price')
+            for model_name in PRICED_MODELS
+        ],
+    ]
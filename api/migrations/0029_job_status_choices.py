@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_decimal_prices'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='delivery',
+            name='status',
+            field=models.TextField(choices=[('Pending', 'Pending'), ('Accepted', 'Accepted'), ('On the way', 'On the way'), ('Arrived', 'Arrived'), ('Received', 'Received'), ('Cancelled', 'Cancelled')], default='Pending'),
+        ),
+        migrations.AlterField(
+            model_name='transportation',
+            name='status',
+            field=models.TextField(choices=[('Pending', 'Pending'), ('Accepted', 'Accepted'), ('On the way', 'On the way'), ('Arrived', 'Arrived'), ('Received', 'Received'), ('Cancelled', 'Cancelled')], default='Pending'),
+        ),
+    ]
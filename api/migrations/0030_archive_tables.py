@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_job_status_choices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDelivery',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('rider', models.TextField(blank=True, null=True)),
+                ('status', models.TextField(choices=[('Pending', 'Pending'), ('Accepted', 'Accepted'), ('On the way', 'On the way'), ('Arrived', 'Arrived'), ('Received', 'Received'), ('Cancelled', 'Cancelled')], default='Arrived')),
+                ('location', models.TextField(blank=True, null=True)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('delivery_issued', models.DateTimeField()),
+                ('payment', models.ImageField(blank=True, null=True, upload_to='payments/')),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('quantity', models.IntegerField(default=0)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('products', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.products')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='archived_delivery_status_idx'), models.Index(fields=['customer', 'id'], name='archived_delivery_cust_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransportation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('rider', models.TextField(blank=True, null=True)),
+                ('status', models.TextField(choices=[('Pending', 'Pending'), ('Accepted', 'Accepted'), ('On the way', 'On the way'), ('Arrived', 'Arrived'), ('Received', 'Received'), ('Cancelled', 'Cancelled')], default='Arrived')),
+                ('current_location', models.TextField(blank=True, null=True)),
+                ('destination', models.TextField(blank=True, null=True)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('date_requested', models.DateTimeField()),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('passenger', models.TextField(blank=True, null=True)),
+                ('payment', models.ImageField(blank=True, null=True, upload_to='payments/')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'date_requested'], name='archived_transport_status_idx'), models.Index(fields=['customer', 'id'], name='archived_transport_cust_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+# Frozen copy of the key scheme in api/counters.py at the time of this
+# migration; the live module may change.
+JOB_MODELS = {
+    'delivery': 'deliveries',
+    'archiveddelivery': 'deliveries',
+    'transportation': 'transportations',
+    'archivedtransportation': 'transportations',
+}
+
+
+def seed_counters(apps, schema_editor):
+    deltas = Counter()
+    for model_name, prefix in JOB_MODELS.items():
+        model = apps.get_model('api', model_name)
+        for row in model.objects.values('status').annotate(n=Count('id')).order_by():
+            deltas[f"{prefix}:{row['status']}"] += row['n']
+        if prefix == 'transportations':
+            days = model.objects.values(day=TruncDate('date_requested')).annotate(n=Count('id')).order_by()
+            for row in days:
+                deltas[f"transportations:day:{row['day'].isoformat()}"] += row['n']
+
+    profiles = apps.get_model('api', 'Profile').objects.exclude(role__isnull=True).exclude(role='')
+    for row in profiles.values('role', 'status').annotate(n=Count('id')).order_by():
+        deltas[f"profiles:{row['role']}:{row['status']}"] += row['n']
+
+    DashboardCounter = apps.get_model('api', 'DashboardCounter')
+    DashboardCounter.objects.bulk_create(
+        DashboardCounter(key=key, value=value) for key, value in deltas.items() if value
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_archive_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_inbox_fields(apps, schema_editor):
+    # Point each room at its newest message and treat existing history as
+    # read, so nobody opens the app to a wall of old "unread" chats.
+    Room = apps.get_model('api', 'Room')
+    Message = apps.get_model('api', 'Message')
+    for room in Room.objects.all().iterator():
+        last = Message.objects.filter(room_id=room.id).order_by('-id').first()
+        if last is None:
+            continue
+        Room.objects.filter(id=room.id).update(
+            last_message_id=last.id,
+            last_message_preview=last.content[:120],
+            last_message_at=last.timestamp,
+            user1_last_read=last.id,
+            user2_last_read=last.id,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_dashboard_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.message'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='user1_last_read',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='user2_last_read',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_inbox_fields, migrations.RunPython.noop),
+    ]
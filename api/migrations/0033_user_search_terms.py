@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:27
+
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of the tokenising in api/search.py at the time of this
+# migration; the live module may change.
+TERM_LENGTH = 150
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.casefold().split())
+
+
+def terms_for(user):
+    """``(term, source, position)`` rows: each first-name suffix, then the username."""
+    rows = []
+    words = normalize(user.first_name).split(' ')
+    for position in range(len(words)):
+        term = ' '.join(words[position:])[:TERM_LENGTH]
+        if term:
+            rows.append((term, 'name', position))
+    username = normalize(user.username)[:TERM_LENGTH]
+    if username:
+        rows.append((username, 'username', 0))
+    return rows
+
+
+def index_existing_users(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserSearchTerm = apps.get_model('api', 'UserSearchTerm')
+    batch = []
+    for user in User.objects.only('id', 'first_name', 'username').iterator(chunk_size=2000):
+        batch.extend(
+            UserSearchTerm(user_id=user.id, term=term, source=source, position=position)
+            for term, source, position in terms_for(user)
+        )
+        if len(batch) >= 2000:
+            UserSearchTerm.objects.bulk_create(batch)
+            batch = []
+    UserSearchTerm.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_room_inbox_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=150)),
+                ('source', models.CharField(choices=[('name', 'First name'), ('username', 'Username')], max_length=10)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term'], name='user_search_term_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+# Frozen copy of the full-text DDL (see api/catalog.py) at the time of this
+# migration; the FTS5 'rebuild' backfills rows that already exist.
+SQLITE_CREATE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS api_products_fts USING fts5(
+        name, type, content='api_products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS api_products_fts_insert AFTER INSERT ON api_products BEGIN
+        INSERT INTO api_products_fts(rowid, name, type) VALUES (new.id, new.name, new.type);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_products_fts_delete AFTER DELETE ON api_products BEGIN
+        INSERT INTO api_products_fts(api_products_fts, rowid, name, type) VALUES ('delete', old.id, old.name, old.type);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_products_fts_update AFTER UPDATE OF name, type ON api_products BEGIN
+        INSERT INTO api_products_fts(api_products_fts, rowid, name, type) VALUES ('delete', old.id, old.name, old.type);
+        INSERT INTO api_products_fts(rowid, name, type) VALUES (new.id, new.name, new.type);
+    END""",
+    "INSERT INTO api_products_fts(api_products_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS api_products_fts_insert',
+    'DROP TRIGGER IF EXISTS api_products_fts_delete',
+    'DROP TRIGGER IF EXISTS api_products_fts_update',
+    'DROP TABLE IF EXISTS api_products_fts',
+]
+
+POSTGRES_CREATE = [
+    "CREATE INDEX IF NOT EXISTS product_search_idx ON api_products USING GIN "
+    "(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(type, '')))",
+]
+
+POSTGRES_DROP = ['DROP INDEX IF EXISTS product_search_idx']
+
+
+def run_statements(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    run_statements(schema_editor, {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE})
+
+
+def drop_search_index(apps, schema_editor):
+    run_statements(schema_editor, {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_user_search_terms'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['type'], name='product_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['status'], name='product_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['quantity'], name='product_quantity_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
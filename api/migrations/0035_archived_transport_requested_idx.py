@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_product_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedtransportation',
+            index=models.Index(fields=['date_requested'], name='archived_transport_req_idx'),
+        ),
+    ]
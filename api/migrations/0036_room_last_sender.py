@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_last_sender(apps, schema_editor):
+    Room = apps.get_model('api', 'Room')
+    Message = apps.get_model('api', 'Message')
+    sender = Message.objects.filter(id=OuterRef('last_message_id')).values('sender_id')[:1]
+    Room.objects.filter(last_message__isnull=False).update(last_sender_id=Subquery(sender))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_archived_transport_requested_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='last_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_last_sender, migrations.RunPython.noop),
+    ]
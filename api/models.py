@@ -1,9 +1,26 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
 
 
-class Profile(models.Model):
+class CountedModel:
+    """
+    Models with dashboard counters (api/counters.py). save() and delete()
+    run in a transaction, so the signal handlers' read of the old row (taken
+    FOR UPDATE) and the counter update commit together and concurrent saves
+    of the same row queue instead of both moving it out of the same status.
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            return super().delete(*args, **kwargs)
+
+
+class Profile(CountedModel, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     role = models.TextField(blank=True, null=True)
     status = models.TextField(default="Pending")
@@ -15,6 +32,11 @@ class Profile(models.Model):
             allowed_extensions=['jpg', 'jpeg', 'png'])]
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['role'], name='profile_role_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
@@ -41,17 +63,35 @@ class Products(models.Model):
             allowed_extensions=['jpg', 'jpeg', 'png'])
         ]
     )
-    price = models.TextField( blank=True, null=True,)
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     date_posted = models.DateTimeField(auto_now_add=True)
     status = models.TextField(default='Available')
     type = models.TextField( blank=True, null=True,)
     quantity = models.IntegerField(default='0')
+
+    class Meta:
+        # Catalog filters; name/type full-text search is in api/catalog.py.
+        indexes = [
+            models.Index(fields=['type'], name='product_type_idx'),
+            models.Index(fields=['status'], name='product_status_idx'),
+            models.Index(fields=['quantity'], name='product_quantity_idx'),
+        ]
     
-class Delivery(models.Model):
+class JobStatus(models.TextChoices):
+    """Lifecycle of deliveries and rides; allowed moves live in api/transitions.py."""
+    PENDING = 'Pending'
+    ACCEPTED = 'Accepted'
+    ON_THE_WAY = 'On the way', 'On the way'
+    ARRIVED = 'Arrived'
+    RECEIVED = 'Received'
+    CANCELLED = 'Cancelled'
+
+
+class Delivery(CountedModel, models.Model):
     customer = models.ForeignKey(User, on_delete=models.CASCADE)
     rider = models.TextField(blank=True, null=True)
     products = models.ForeignKey(Products, on_delete=models.CASCADE)
-    status = models.TextField(default='Pending')
+    status = models.TextField(choices=JobStatus.choices, default=JobStatus.PENDING)
     location = models.TextField(blank=True, null=True)
     message = models.TextField(blank=True, null=True)
     delivery_issued = models.DateTimeField(auto_now_add=True)
@@ -63,18 +103,24 @@ class Delivery(models.Model):
             allowed_extensions=['jpg', 'jpeg', 'png'])
         ]
     )
-    price = models.TextField(blank=True, null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)  # line total
     quantity = models.IntegerField(default=0)
 
-class Transportation(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='delivery_status_id_idx'),
+            models.Index(fields=['customer', 'id'], name='delivery_customer_id_idx'),
+        ]
+
+class Transportation(CountedModel, models.Model):
     customer = models.ForeignKey(User, on_delete=models.CASCADE)
     rider = models.TextField(blank=True, null=True)
-    status = models.TextField(default='Pending')
+    status = models.TextField(choices=JobStatus.choices, default=JobStatus.PENDING)
     current_location = models.TextField(blank=True, null=True)
     destination = models.TextField(blank=True, null=True)
     message = models.TextField(blank=True, null=True)
     date_requested = models.DateTimeField(auto_now_add=True)
-    price = models.TextField(blank=True, null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     passenger = models.TextField(blank=True, null=True)
     payment = models.ImageField(
         upload_to='payments/',
@@ -84,12 +130,27 @@ class Transportation(models.Model):
             allowed_extensions=['jpg', 'jpeg', 'png'])
         ]
     )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_requested'], name='transport_requested_idx'),
+            models.Index(fields=['status', 'date_requested'], name='transport_status_req_idx'),
+            models.Index(fields=['customer', 'id'], name='transport_customer_id_idx'),
+        ]
     
     
 class Room(models.Model):
     user1 = models.ForeignKey(User, related_name="room_user1", on_delete=models.CASCADE)
     user2 = models.ForeignKey(User, related_name="room_user2", on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized for the inbox (see api/inbox.py): the newest message, who
+    # sent it and how far each participant has read, as a message id.
+    last_message = models.ForeignKey('Message', null=True, blank=True, related_name='+', on_delete=models.SET_NULL)
+    last_sender = models.ForeignKey(User, null=True, blank=True, related_name='+', on_delete=models.SET_NULL)
+    last_message_preview = models.CharField(max_length=120, blank=True, default='')
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    user1_last_read = models.BigIntegerField(default=0)
+    user2_last_read = models.BigIntegerField(default=0)
 
     class Meta:
         unique_together = ('user1', 'user2')  # Prevent duplicate rooms
@@ -98,4 +159,90 @@ class Message(models.Model):
     room = models.ForeignKey(Room, related_name="messages", on_delete=models.CASCADE)
     sender = models.ForeignKey(User, related_name="sent_messages", on_delete=models.CASCADE)
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'id'], name='message_room_id_idx'),  # chat history cursors
+        ]
+
+class UserSearchTerm(models.Model):
+    """
+    Normalized words of a user's first name and their username, kept in sync
+    by api/search.py so type-ahead search is an index range scan.
+    """
+    NAME = 'name'
+    USERNAME = 'username'
+
+    user = models.ForeignKey(User, related_name='search_terms', on_delete=models.CASCADE)
+    term = models.CharField(max_length=150)
+    source = models.CharField(max_length=10, choices=[(NAME, 'First name'), (USERNAME, 'Username')])
+    position = models.PositiveSmallIntegerField(default=0)  # word index within the name
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term'], name='user_search_term_idx'),
+        ]
+
+
+class ResourceVersion(models.Model):
+    """Per-table change counter used for cheap ETags (see api/versions.py)."""
+    key = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class DashboardCounter(models.Model):
+    """Running row counts for the admin dashboard (see api/counters.py)."""
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+# Archive tier: finished jobs moved out of the hot tables by the
+# archive_jobs command. Same columns and ids as the originals, so the list
+# serializers work on either.
+
+class ArchivedDelivery(CountedModel, models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    rider = models.TextField(blank=True, null=True)
+    products = models.ForeignKey(Products, on_delete=models.CASCADE, related_name='+')
+    status = models.TextField(choices=JobStatus.choices, default=JobStatus.ARRIVED)
+    location = models.TextField(blank=True, null=True)
+    message = models.TextField(blank=True, null=True)
+    delivery_issued = models.DateTimeField()
+    payment = models.ImageField(upload_to='payments/', blank=True, null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='archived_delivery_status_idx'),
+            models.Index(fields=['customer', 'id'], name='archived_delivery_cust_idx'),
+        ]
+
+
+class ArchivedTransportation(CountedModel, models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    rider = models.TextField(blank=True, null=True)
+    status = models.TextField(choices=JobStatus.choices, default=JobStatus.ARRIVED)
+    current_location = models.TextField(blank=True, null=True)
+    destination = models.TextField(blank=True, null=True)
+    message = models.TextField(blank=True, null=True)
+    date_requested = models.DateTimeField()
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    passenger = models.TextField(blank=True, null=True)
+    payment = models.ImageField(upload_to='payments/', blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_requested'], name='archived_transport_req_idx'),
+            models.Index(fields=['status', 'date_requested'], name='archived_transport_status_idx'),
+            models.Index(fields=['customer', 'id'], name='archived_transport_cust_idx'),
+        ]
@@ -0,0 +1,171 @@
+import csv
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .counters import count_created
+from .models import Profile
+from .search import index_users
+from .versions import bump_model_version
+
+COLUMNS = ('username', 'password', 'first_name', 'email', 'role')
+DEFAULT_ROLE = 'Rider'  # same fallback as RegisterSerializer
+# User columns checked with the model's validators, as RegisterSerializer does.
+VALIDATED_FIELDS = ('username', 'first_name', 'email')
+
+
+def _init_worker():
+    # Spawned (not forked) workers start without Django configured.
+    if not apps.ready:
+        django.setup()
+
+
+def _hash_passwords(passwords, pool, workers):
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hash_pool():
+    """
+    ``(pool, workers)`` shared by every import this process serves, started
+    on first use with USER_IMPORT_WORKERS processes (default: up to 4).
+    Requests queue on it instead of each starting their own. The pool is
+    None when configured for 1 worker.
+    """
+    global _pool
+    workers = getattr(settings, 'USER_IMPORT_WORKERS', min(4, os.cpu_count() or 1))
+    if workers <= 1:
+        return None, 1
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    return _pool, workers
+
+
+def read_rows(stream):
+    """Yields (line number, row dict) from a CSV with a header row."""
+    reader = csv.DictReader(stream)
+    missing = {'username', 'password'} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+    for row in reader:
+        yield reader.line_num, {column: (row.get(column) or '').strip() for column in COLUMNS}
+
+
+def row_error(row):
+    """Why RegisterSerializer would reject ``row``, or None."""
+    if not row['username'] or not row['password']:
+        return 'username and password are required'
+    for name in VALIDATED_FIELDS:
+        if row[name]:
+            try:
+                User._meta.get_field(name).run_validators(row[name])
+            except ValidationError as e:
+                return f"{name}: {' '.join(e.messages)}"
+    return None
+
+
+def import_users(rows, chunk_size=500, workers=None, default_role=DEFAULT_ROLE, pool=None):
+    """
+    Registers users from ``read_rows()`` output the way RegisterView does
+    (``last_name='Pending'``, a Profile with the row's role), ``chunk_size``
+    rows per transaction. Passwords are hashed on ``pool`` of ``workers``
+    processes if given (see ``hash_pool``), otherwise across ``workers``
+    processes started for this call (``os.cpu_count()`` by default; 1
+    hashes in this process), and each chunk's users and profiles go in with
+    one bulk insert apiece. Rows the signup form would reject (see
+    ``row_error``) are reported as invalid.
+
+    Duplicates, against the existing users and earlier rows of the same
+    file, are found in one pass over a preloaded username set and skipped.
+    Usernames registered by someone else after the preload are reported as
+    duplicates too (see ``_insert_chunk``).
+    """
+    workers = workers or os.cpu_count() or 1
+    own_pool = None
+    if pool is None and workers > 1:
+        pool = own_pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    existing = set(User.objects.values_list('username', flat=True).iterator())
+    report = {'created': 0, 'duplicates': [], 'invalid': []}
+
+    try:
+        rows = iter(rows)
+        while chunk := list(islice(rows, chunk_size)):
+            accepted = []
+            for line, row in chunk:
+                error = row_error(row)
+                if error:
+                    report['invalid'].append({'line': line, 'error': error})
+                elif row['username'] in existing:
+                    report['duplicates'].append({'line': line, 'username': row['username']})
+                else:
+                    existing.add(row['username'])
+                    accepted.append((line, row))
+            if accepted:
+                hashes = _hash_passwords([row['password'] for _, row in accepted], pool, workers)
+                report['created'] += _insert_chunk(accepted, hashes, default_role, report['duplicates'])
+    finally:
+        if own_pool is not None:
+            own_pool.shutdown()
+    if report['created']:
+        bump_model_version(Profile)
+    report['duplicates'].sort(key=lambda duplicate: duplicate['line'])
+    return report
+
+
+def _insert_chunk(accepted, hashes, default_role, duplicates):
+    """
+    Insert ``[(line, row)]`` with their hashes; returns how many went in.
+    If a username was registered since the preload, the chunk's transaction
+    rolls back, the taken rows move to ``duplicates`` and the rest retry.
+    """
+    while accepted:
+        try:
+            return _insert_rows([row for _, row in accepted], hashes, default_role)
+        except IntegrityError:
+            usernames = [row['username'] for _, row in accepted]
+            taken = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+            if not taken:
+                raise
+            kept = [(entry, password) for entry, password in zip(accepted, hashes) if entry[1]['username'] not in taken]
+            duplicates.extend(
+                {'line': line, 'username': row['username']} for line, row in accepted if row['username'] in taken
+            )
+            accepted = [entry for entry, _ in kept]
+            hashes = [password for _, password in kept]
+    return 0
+
+
+def _insert_rows(rows, hashes, default_role):
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(
+                username=row['username'],
+                password=password,
+                first_name=row['first_name'],
+                last_name='Pending',
+                email=row['email'],
+            )
+            for row, password in zip(rows, hashes)
+        ])
+        profiles = Profile.objects.bulk_create([
+            Profile(user=user, role=row['role'] or default_role)
+            for user, row in zip(users, rows)
+        ])
+        count_created(profiles)
+        index_users(users)
+    return len(users)
@@ -0,0 +1,33 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """
+    Keyset pagination that only kicks in when the client asks for it
+    (``?cursor=`` or ``?page_size=``), so older app builds that expect a
+    plain list keep working. Set ``CURSOR_PAGINATION_BY_DEFAULT = True``
+    to paginate every list response.
+
+    Views can pick their keyset with a ``cursor_ordering`` attribute.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-id',)
+
+    def is_requested(self, request):
+        if getattr(settings, 'CURSOR_PAGINATION_BY_DEFAULT', False):
+            return True
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
@@ -0,0 +1,200 @@
+import hashlib
+import heapq
+import json
+import math
+import re
+import threading
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .geo import EARTH_RADIUS_KM, haversine_km
+
+# km/h used when a road has no usable maxspeed tag.
+DEFAULT_SPEEDS = {
+    'motorway': 80, 'trunk': 60, 'primary': 50, 'secondary': 40, 'tertiary': 35,
+    'unclassified': 30, 'residential': 25, 'service': 15, 'track': 15,
+}
+FALLBACK_SPEED = 25
+
+
+def _speed(properties):
+    match = re.match(r'\s*(\d+(?:\.\d+)?)', str(properties.get('maxspeed') or ''))
+    if match:
+        return float(match.group(1))
+    return DEFAULT_SPEEDS.get(properties.get('highway'), FALLBACK_SPEED)
+
+
+def _oneway(properties):
+    value = str(properties.get('oneway', '')).lower()
+    return {'yes': 1, 'true': 1, '1': 1, '-1': -1, 'reverse': -1}.get(value, 0)
+
+
+class RoadGraph:
+    """
+    Road network as CSR arrays: the edges leaving node ``i`` are
+    ``indices[indptr[i]:indptr[i + 1]]`` with matching ``length_m`` and
+    ``seconds``. Routes are A* on travel time and memoized per node pair;
+    the memo belongs to the instance, and ``fingerprint`` (a hash of the
+    source file) lets caches outside it tell graphs apart.
+    """
+
+    def __init__(self, lat, lng, indptr, indices, length_m, seconds, cache_size=4096, fingerprint=''):
+        if not len(lat) or not len(seconds):
+            raise ValueError("Road graph has no roads")
+        self.fingerprint = fingerprint
+        self.lat = lat
+        self.lng = lng
+        self.indptr = indptr
+        self.indices = indices
+        self.length_m = length_m
+        self.seconds = seconds
+        self.max_speed_mps = float(np.max(length_m / np.maximum(seconds, 1e-9))) if len(seconds) else 1.0
+        self._cos_lat = np.cos(np.radians(lat))
+        self.route_nodes = lru_cache(maxsize=cache_size)(self._astar)
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_geojson(cls, path, **kwargs):
+        """Build from a GeoJSON export of road LineStrings (e.g. an OSM highway extract)."""
+        with open(path, 'rb') as f:
+            raw = f.read()
+        features = json.loads(raw).get('features', [])
+        kwargs.setdefault('fingerprint', hashlib.sha1(raw).hexdigest()[:12])
+
+        node_ids = {}
+        edges = []  # (from, to, length_m, seconds)
+
+        def node(coordinate):
+            key = (round(coordinate[1], 6), round(coordinate[0], 6))  # GeoJSON is lng, lat
+            if key not in node_ids:
+                node_ids[key] = len(node_ids)
+            return node_ids[key]
+
+        for feature in features:
+            geometry = feature.get('geometry') or {}
+            properties = feature.get('properties') or {}
+            if geometry.get('type') == 'LineString':
+                lines = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiLineString':
+                lines = geometry['coordinates']
+            else:
+                continue
+            mps = _speed(properties) / 3.6
+            oneway = _oneway(properties)
+            for line in lines:
+                for start, end in zip(line, line[1:]):
+                    a, b = node(start), node(end)
+                    if a == b:
+                        continue
+                    length = haversine_km(start[1], start[0], end[1], end[0]) * 1000
+                    if oneway >= 0:
+                        edges.append((a, b, length, length / mps))
+                    if oneway <= 0:
+                        edges.append((b, a, length, length / mps))
+
+        coordinates = np.array(sorted(node_ids, key=node_ids.get), dtype=float).reshape(-1, 2)
+        edge_array = np.array(edges, dtype=float).reshape(-1, 4)
+        order = np.argsort(edge_array[:, 0], kind='stable')
+        edge_array = edge_array[order]
+        sources = edge_array[:, 0].astype(np.int32)
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.add.at(indptr, sources + 1, 1)
+        return cls(
+            lat=coordinates[:, 0],
+            lng=coordinates[:, 1],
+            indptr=np.cumsum(indptr),
+            indices=edge_array[:, 1].astype(np.int32),
+            length_m=edge_array[:, 2],
+            seconds=edge_array[:, 3],
+            **kwargs,
+        )
+
+    def nearest_node(self, lat, lng):
+        """Index of the closest node and its distance in km (equirectangular, fine at city scale)."""
+        dy = np.radians(self.lat - lat)
+        dx = np.radians(self.lng - lng) * self._cos_lat
+        squared = dx * dx + dy * dy
+        i = int(np.argmin(squared))
+        return i, math.sqrt(squared[i]) * EARTH_RADIUS_KM
+
+    def _astar(self, source, target):
+        """(metres, seconds, node path) of the fastest route, or None if unreachable."""
+        indptr, indices, seconds, length_m = self.indptr, self.indices, self.seconds, self.length_m
+        t_lat, t_lng = self.lat[target], self.lng[target]
+        speed_kmps = self.max_speed_mps / 1000
+
+        def heuristic(n):
+            return haversine_km(self.lat[n], self.lng[n], t_lat, t_lng) / speed_kmps
+
+        best = {source: 0.0}
+        previous = {source: (None, 0.0)}
+        heap = [(heuristic(source), 0.0, source)]
+        closed = set()
+        while heap:
+            _, cost, n = heapq.heappop(heap)
+            if n == target:
+                break
+            if n in closed:
+                continue
+            closed.add(n)
+            for e in range(indptr[n], indptr[n + 1]):
+                m = int(indices[e])
+                new_cost = cost + seconds[e]
+                if new_cost < best.get(m, math.inf):
+                    best[m] = new_cost
+                    previous[m] = (n, length_m[e])
+                    heapq.heappush(heap, (new_cost + heuristic(m), new_cost, m))
+        else:
+            return None
+
+        path, metres, n = [], 0.0, target
+        while n is not None:
+            path.append(n)
+            n, length = previous[n]
+            metres += length
+        path.reverse()
+        return metres, best[target], tuple(path)
+
+    def route(self, origin, destination, max_snap_km=0.5):
+        """Fastest road route between two (lat, lng) points, or None if either is off the network."""
+        source, snap_a = self.nearest_node(*origin)
+        target, snap_b = self.nearest_node(*destination)
+        if snap_a > max_snap_km or snap_b > max_snap_km:
+            return None
+        result = self.route_nodes(source, target)
+        if result is None:
+            return None
+        metres, seconds, path = result
+        return {
+            'distance_km': round(metres / 1000, 3),
+            'duration_min': round(seconds / 60, 1),
+            'path': [[float(self.lat[n]), float(self.lng[n])] for n in path],
+        }
+
+
+_graph = None
+_graph_loaded = False
+_graph_lock = threading.Lock()
+
+
+def get_road_graph():
+    """The graph from ROAD_GRAPH_PATH, loaded once per process; None when routing isn't configured."""
+    global _graph, _graph_loaded
+    if not _graph_loaded:
+        with _graph_lock:
+            if not _graph_loaded:
+                path = getattr(settings, 'ROAD_GRAPH_PATH', None)
+                _graph = RoadGraph.from_geojson(path) if path else None
+                _graph_loaded = True
+    return _graph
+
+
+def road_route(origin, destination):
+    graph = get_road_graph()
+    if graph is None:
+        return None
+    return graph.route(origin, destination, getattr(settings, 'ROAD_SNAP_MAX_KM', 0.5))
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/chat/<int:user1_id>/<int:user2_id>/', consumers.ChatConsumer.as_asgi(), name='chat-socket'),
+    path('ws/transport-map/<int:transportation_id>/', consumers.RideLocationConsumer.as_asgi(), name='transport-map-socket'),
+]
@@ -0,0 +1,81 @@
+import unicodedata
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import UserSearchTerm
+
+# Highest code point; "term < prefix + MAX_CHAR" bounds every extension of prefix.
+MAX_CHAR = '\U0010ffff'
+TERM_LENGTH = UserSearchTerm._meta.get_field('term').max_length
+
+
+def normalize(text):
+    """Case-folded, accent-stripped, single-spaced: 'José  Ñino' -> 'jose nino'."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.casefold().split())
+
+
+def terms_for(user):
+    """
+    Search rows for ``user``: the whole first name and each later word of
+    it (so "clara" finds "Maria Clara"), plus the username.
+    """
+    rows = []
+    words = normalize(user.first_name).split(' ')
+    for position in range(len(words)):
+        term = ' '.join(words[position:])[:TERM_LENGTH]
+        if term:
+            rows.append(UserSearchTerm(user_id=user.id, term=term, source=UserSearchTerm.NAME, position=position))
+    username = normalize(user.username)[:TERM_LENGTH]
+    if username:
+        rows.append(UserSearchTerm(user_id=user.id, term=username, source=UserSearchTerm.USERNAME))
+    return rows
+
+
+def index_users(users):
+    """(Re)build the search rows for ``users`` with one delete and one insert."""
+    users = list(users)
+    with transaction.atomic():
+        UserSearchTerm.objects.filter(user_id__in=[user.id for user in users]).delete()
+        UserSearchTerm.objects.bulk_create([row for user in users for row in terms_for(user)])
+
+
+def _rank(row, query):
+    term, source, position = row[1], row[2], row[3]
+    return (
+        term != query,                        # exact matches first
+        source != UserSearchTerm.NAME,        # then names over usernames
+        position,                             # then first-word over later-word matches
+        len(term),                            # then the shortest completion
+        term,
+    )
+
+
+def search_users(query, limit=10, scan=200):
+    """
+    Top ``limit`` users whose first-name words or username start with
+    ``query``. Reads at most ``scan`` matching terms in index order, which
+    is plain alphabetical, ranks only those in Python and returns
+    ``[{"id", "first_name", "username"}]``. With more than ``scan`` matches
+    a better-ranked term later in the alphabet can be missed; typing one
+    more letter narrows the range.
+    """
+    query = normalize(query)
+    if not query:
+        return []
+    # A bounded range scan of the term index; sorting the whole prefix range
+    # by length would read every match for short queries.
+    candidates = list(
+        UserSearchTerm.objects.filter(term__gte=query, term__lt=query + MAX_CHAR)
+        .order_by('term')
+        .values_list('user_id', 'term', 'source', 'position')[:scan]
+    )
+    best = {}
+    for row in sorted(candidates, key=lambda row: _rank(row, query)):
+        best.setdefault(row[0], len(best))
+        if len(best) == limit:
+            break
+    users = {row['id']: row for row in User.objects.filter(id__in=list(best)).values('id', 'first_name', 'username')}
+    return [users[user_id] for user_id in sorted(best, key=best.get) if user_id in users]
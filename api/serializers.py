@@ -3,6 +3,25 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Profile, Products, Delivery, Transportation, Message, Room
 from django.db import models
+from .geo import parse_coordinates
+from .images import variant_urls
+
+
+class ImageVariantsField(serializers.Field):
+    """Read-only URLs of the resized copies of an image field."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        urls = variant_urls(value)
+        if request is not None:
+            urls = {variant: url and request.build_absolute_uri(url) for variant, url in urls.items()}
+        return urls
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -16,10 +35,11 @@ class ProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     first_name = serializers.CharField(source='user.first_name', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
+    profile_picture_variants = ImageVariantsField(source='profile_picture')
 
     class Meta:
         model = Profile
-        fields = ['username', 'first_name', 'email', 'role', 'status', 'profile_picture']
+        fields = ['username', 'first_name', 'email', 'role', 'status', 'profile_picture', 'profile_picture_variants']
 
 
 class RiderSerializer(serializers.ModelSerializer):
@@ -32,6 +52,10 @@ class RiderSerializer(serializers.ModelSerializer):
             'is_active', 'is_staff', 'is_superuser', 'date_joined',
             'profile'
         ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('profile')
         
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -69,44 +93,55 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 class ClientsSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    profile_picture_variants = ImageVariantsField(source='profile_picture')
 
     class Meta:
         model = Profile
-        fields = ['id', 'user', 'role', 'status', 'profile_picture']
+        fields = ['id', 'user', 'role', 'status', 'profile_picture', 'profile_picture_variants']
         
 
 
 class ProductSerializer(serializers.ModelSerializer):
+    picture_variants = ImageVariantsField(source='picture')
+
     class Meta:
         model = Products
-        fields = ['id', 'name', 'picture', 'date_posted', 'status', 'price', 'type', 'quantity']
+        fields = ['id', 'name', 'picture', 'picture_variants', 'date_posted', 'status', 'price', 'type', 'quantity']
         read_only_fields = ['id', 'date_posted']  # ✅ removed status
 
 
 class DeliverySerializer(serializers.ModelSerializer):
     customer = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     products = serializers.PrimaryKeyRelatedField(queryset=Products.objects.all())
+    payment_variants = ImageVariantsField(source='payment')
 
     class Meta:
         model = Delivery
-        fields = ['id', 'customer', 'rider', 'products', 'status', 'location', 'delivery_issued', 'price', 'payment', 'message', 'quantity']
+        fields = ['id', 'customer', 'rider', 'products', 'status', 'location', 'delivery_issued', 'price', 'payment', 'payment_variants', 'message', 'quantity']
         read_only_fields = ['id']
 
 
 class DeliveryListsSerializer(serializers.ModelSerializer):
     products = ProductSerializer(read_only=True)
     customer = UserSerializer(read_only=True)
+    payment_variants = ImageVariantsField(source='payment')
 
     class Meta:
         model = Delivery
-        fields = ['id', 'customer', 'rider', 'products', 'status', 'location', 'message', 'delivery_issued', 'payment', 'quantity']
+        fields = ['id', 'customer', 'rider', 'products', 'status', 'location', 'message', 'delivery_issued', 'payment', 'payment_variants', 'quantity']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('products', 'customer')
         
         
 
 class TransportationSerializer(serializers.ModelSerializer):
+    payment_variants = ImageVariantsField(source='payment')
+
     class Meta:
         model = Transportation
-        fields = ['id', 'customer', 'date_requested', 'rider', 'status', 'current_location', 'destination', 'message', 'price', 'payment', 'passenger']
+        fields = ['id', 'customer', 'date_requested', 'rider', 'status', 'current_location', 'destination', 'message', 'price', 'payment', 'payment_variants', 'passenger']
         read_only_fields = ['customer', 'status', 'rider', 'date_requested']
 
     def create(self, validated_data):
@@ -137,3 +172,64 @@ class RoomSerializer(serializers.ModelSerializer):
         
 class ProductQuantityDeductSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1)
+
+
+class ProductQuantityLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class ProductQuantityBatchDeductSerializer(serializers.Serializer):
+    items = ProductQuantityLineSerializer(many=True, allow_empty=False)
+
+
+
+class LocationPointSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    timestamp = serializers.FloatField(required=False)
+
+
+class RiderPositionSerializer(LocationPointSerializer):
+    available = serializers.BooleanField(default=True)
+
+
+class CartCheckoutSerializer(ProductQuantityBatchDeductSerializer):
+    location = serializers.CharField(required=False, allow_blank=True, default='')
+    rider = serializers.CharField(required=False, allow_blank=True, default='')
+    message = serializers.CharField(required=False, allow_blank=True, allow_null=True, default=None)
+
+
+class RevenueFilterSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    status = serializers.CharField(required=False)
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    type = serializers.CharField(required=False)
+    status = serializers.CharField(required=False)
+    in_stock = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+
+class FareTripSerializer(serializers.Serializer):
+    current_location = serializers.CharField()
+    destination = serializers.CharField()
+
+    def validate_current_location(self, value):
+        return self.coordinates(value)
+
+    def validate_destination(self, value):
+        return self.coordinates(value)
+
+    @staticmethod
+    def coordinates(value):
+        point = parse_coordinates(value)
+        if point is None:
+            raise serializers.ValidationError('Expected "lat,lng".')
+        return point
+
+
+class FareQuoteSerializer(serializers.Serializer):
+    trips = FareTripSerializer(many=True, allow_empty=False, max_length=1000)
@@ -0,0 +1,125 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+
+from .counters import COUNTED_MODELS, counter_keys, move_keys, stored_counter_keys
+from .dispatch import track_assignment
+from .images import render_variants
+from .models import Delivery, Products, Profile, Transportation
+from .search import index_users
+from .tracking import RIDE_OVER, finish_ride
+from .versions import VERSION_KEYS, bump_model_version
+
+
+# Image variants are rendered when an upload is saved, never while serving
+# a list. Connected before the version bump so a payload cached after the
+# bump already has its variant URLs.
+IMAGE_FIELDS = {
+    Products: ('picture',),
+    Profile: ('profile_picture',),
+    Delivery: ('payment',),
+    Transportation: ('payment',),
+}
+
+
+def render_uploaded_variants(sender, instance, update_fields=None, **kwargs):
+    for field in IMAGE_FIELDS[sender]:
+        if update_fields is not None and field not in update_fields:
+            continue
+        fieldfile = getattr(instance, field)
+        if fieldfile:
+            render_variants(fieldfile)
+
+
+for model in IMAGE_FIELDS:
+    post_save.connect(render_uploaded_variants, sender=model, dispatch_uid=f'images-render-{model.__name__}')
+
+
+def bump_sender_version(sender, **kwargs):
+    bump_model_version(sender)
+
+
+for model in VERSION_KEYS:
+    post_save.connect(bump_sender_version, sender=model, dispatch_uid=f'version-save-{model.__name__}')
+    post_delete.connect(bump_sender_version, sender=model, dispatch_uid=f'version-delete-{model.__name__}')
+
+
+# Dashboard counters. A save moves the row out of the counters it was in
+# (one primary-key read, locked: CountedModel.save() runs in a transaction)
+# and into the ones it is in now; a delete drops it from the counters of the
+# instance the delete collector loaded.
+
+def touches_counters(sender, update_fields):
+    _, fields = COUNTED_MODELS[sender]
+    return update_fields is None or not update_fields.isdisjoint(fields)
+
+
+def load_stored_counter_keys(sender, instance, update_fields=None, **kwargs):
+    if touches_counters(sender, update_fields):
+        instance._counter_keys = stored_counter_keys(sender, instance.pk, for_update=True) if instance.pk is not None else ()
+
+
+def load_deleted_counter_keys(sender, instance, **kwargs):
+    keys = counter_keys(instance)
+    instance._counter_keys = stored_counter_keys(sender, instance.pk) if keys is None else keys
+
+
+def update_counters_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if not touches_counters(sender, update_fields):
+        return
+    # After a partial save the other counted fields may be stale in memory.
+    new_keys = counter_keys(instance) if update_fields is None else None
+    if new_keys is None:
+        new_keys = stored_counter_keys(sender, instance.pk)
+    move_keys(() if created else instance._counter_keys, new_keys)
+
+
+def update_counters_on_delete(sender, instance, **kwargs):
+    move_keys(instance._counter_keys, ())
+
+
+for model in COUNTED_MODELS:
+    pre_save.connect(load_stored_counter_keys, sender=model, dispatch_uid=f'counters-pre-save-{model.__name__}')
+    post_save.connect(update_counters_on_save, sender=model, dispatch_uid=f'counters-save-{model.__name__}')
+    pre_delete.connect(load_deleted_counter_keys, sender=model, dispatch_uid=f'counters-pre-delete-{model.__name__}')
+    post_delete.connect(update_counters_on_delete, sender=model, dispatch_uid=f'counters-delete-{model.__name__}')
+
+
+# Type-ahead search rows follow the user's first name and username.
+SEARCHED_USER_FIELDS = {'first_name', 'username'}
+
+
+def reindex_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or not SEARCHED_USER_FIELDS.isdisjoint(update_fields):
+        index_users([instance])
+
+
+post_save.connect(reindex_user, sender=User, dispatch_uid='search-reindex-user')
+
+
+# A ride saved into an ending status writes its last buffered GPS point
+# (compare_and_set covers the queryset-update path).
+def finish_tracked_ride(sender, instance, update_fields=None, **kwargs):
+    if (update_fields is None or 'status' in update_fields) and instance.status in RIDE_OVER:
+        finish_ride(instance.pk)
+
+
+post_save.connect(finish_tracked_ride, sender=Transportation, dispatch_uid='tracking-finish-ride')
+
+
+# Riders holding a job stay out of the dispatch pool until it ends
+# (compare_and_set and the claim views cover the queryset-update paths).
+ASSIGNMENT_FIELDS = {'rider', 'status'}
+
+
+def track_job_rider(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or not ASSIGNMENT_FIELDS.isdisjoint(update_fields):
+        track_assignment(sender, instance.pk, instance.rider, instance.status)
+
+
+def release_job_rider(sender, instance, **kwargs):
+    track_assignment(sender, instance.pk, None, None)
+
+
+for model in (Delivery, Transportation):
+    post_save.connect(track_job_rider, sender=model, dispatch_uid=f'dispatch-track-{model.__name__}')
+    post_delete.connect(release_job_rider, sender=model, dispatch_uid=f'dispatch-release-{model.__name__}')
@@ -0,0 +1,34 @@
+import threading
+
+from .versions import get_version
+
+
+class VersionedSnapshot:
+    """
+    Per-process copy of an already serialized response body, reused until the
+    ResourceVersion counter for ``key`` moves. Every worker checks the shared
+    counter on each request, so all of them pick up a write on their next hit.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def get(self, request, build):
+        # Serialized URLs are absolute, so snapshots are per host as well.
+        stamp = (get_version(self.key, request), request.build_absolute_uri('/'))
+        entry = self._entry
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        data = build()
+        with self._lock:
+            self._entry = (stamp, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+
+catalog_snapshot = VersionedSnapshot('products')
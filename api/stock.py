@@ -0,0 +1,99 @@
+import time
+from collections import Counter
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from .models import Products
+from .versions import bump_model_version
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id):
+        super().__init__(f"Insufficient stock for product {product_id}")
+        self.product_id = product_id
+
+
+LOCK_RETRIES = 20
+
+
+def _retry_when_locked(func, *args):
+    """
+    SQLite reports writer contention as "database/table is locked" instead of
+    queueing. A failed conditional update changed nothing, so it is safe to
+    run again; inside an outer transaction the caller has to handle it.
+    """
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return func(*args)
+        except OperationalError as e:
+            if connection.in_atomic_block or 'locked' not in str(e) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(0.005 * (attempt + 1))
+
+
+def _supports_update_returning():
+    # can_return_columns_from_insert is about INSERT; MariaDB has INSERT ...
+    # RETURNING but no UPDATE ... RETURNING, so go by vendor.
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def _deduct(product_id, quantity):
+    """
+    Conditional decrement; the WHERE clause is the stock check, so there is
+    no read-then-write window. Returns the remaining quantity, or None if
+    the product is missing or short.
+    """
+    if _supports_update_returning():
+        table = connection.ops.quote_name(Products._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET quantity = quantity - %s "
+                f"WHERE id = %s AND quantity >= %s RETURNING quantity",
+                [quantity, product_id, quantity],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    updated = Products.objects.filter(id=product_id, quantity__gte=quantity).update(
+        quantity=F('quantity') - quantity
+    )
+    if not updated:
+        return None
+    return Products.objects.filter(id=product_id).values_list('quantity', flat=True).first()
+
+
+def deduct_stock(product_id, quantity):
+    remaining = _retry_when_locked(_deduct, product_id, quantity)
+    if remaining is None:
+        raise InsufficientStock(product_id)
+    _retry_when_locked(bump_model_version, Products)
+    return remaining
+
+
+def deduct_stock_batch(items):
+    """
+    Deduct many ``(product_id, quantity)`` lines all-or-nothing. Lines for the
+    same product are merged and rows are touched in id order so concurrent
+    batches can't deadlock each other.
+    """
+    totals = Counter()
+    for product_id, quantity in items:
+        totals[product_id] += quantity
+    return _retry_when_locked(_deduct_all, totals)
+
+
+def _deduct_all(totals):
+    remaining = {}
+    with transaction.atomic():
+        for product_id in sorted(totals):
+            left = _deduct(product_id, totals[product_id])
+            if left is None:
+                raise InsufficientStock(product_id)
+            remaining[product_id] = left
+        bump_model_version(Products)
+    return remaining
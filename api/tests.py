@@ -1,3 +1,1329 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+import csv
+from decimal import Decimal
+import heapq
+import json
+import os
+import random
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.http import Http404
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from . import onboarding
+from .archive import archive_batch
+from .authentication import user_rows
+from .counters import dashboard_counts, rebuild_counters
+from .dispatch import RiderIndex, rider_index
+from .fares import distance_matrix, haversine_pairs, quote_trips
+from .geo import haversine_km
+from .images import FAILED, render_variants, variant_name, variant_state
+from .inbox import mark_read
+from .roads import RoadGraph
+from .models import ArchivedDelivery, Delivery, JobStatus, Message, Products, Profile, Transportation
+from .onboarding import import_users
+from .routing import websocket_urlpatterns
+from .snapshots import catalog_snapshot
+from .stock import InsufficientStock, deduct_stock, deduct_stock_batch
+from .tracking import RideTracker, save_locations, tracker
+from .transitions import AlreadyClaimed, InvalidTransition, StatusConflict, compare_and_set
+from .versions import get_version
+
+
+class DeliveryListQueryCountTests(TestCase):
+    def seed(self, count):
+        customer = User.objects.create(username=f'customer{Delivery.objects.count()}')
+        product = Products.objects.create(name='Rice', price='50', quantity=10)
+        Delivery.objects.bulk_create(
+            Delivery(customer=customer, products=product, status='Arrived')
+            for _ in range(count)
+        )
+        return customer
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        customer = self.seed(1)
+        urls = ['/api/deliveries/', '/api/deliveries/arrived/', f'/api/deliveries/user/{customer.id}/']
+        baseline = {url: self.count_queries(url) for url in urls}
+
+        self.seed(999)
+        self.assertEqual(Delivery.objects.count(), 1000)
+        for url in urls:
+            self.assertEqual(self.count_queries(url), baseline[url], url)
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        variant_state.clear()
+        self.addCleanup(variant_state.clear)
+        # Versions restart with each test's rollback; drop snapshots built
+        # by other tests at the same version number.
+        catalog_snapshot.clear()
+
+    def image(self, name, fmt):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 400), (200, 30, 30)).save(buffer, format=fmt)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_upload_renders_variants_per_source_extension(self):
+        png = Products.objects.create(name='A', picture=self.image('x.png', 'PNG'))
+        jpg = Products.objects.create(name='B', picture=self.image('x.jpg', 'JPEG'))
+        names = {variant_name(product.picture.name, 'thumbnail') for product in (png, jpg)}
+        self.assertEqual(len(names), 2)
+        for name in names:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_warm_list_makes_no_storage_calls(self):
+        for index in range(3):
+            Products.objects.create(name=f'P{index}', picture=self.image(f'p{index}.png', 'PNG'))
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        exists.assert_not_called()
+        self.assertTrue(all(row['picture_variants']['thumbnail'] for row in response.json()))
+
+    def test_variants_exist_before_the_version_bump(self):
+        seen = []
+
+        def bump(model):
+            if model is Products:
+                product = Products.objects.get()
+                seen.append(default_storage.exists(variant_name(product.picture.name, 'thumbnail')))
+
+        with mock.patch('api.signals.bump_model_version', side_effect=bump):
+            Products.objects.create(name='A', picture=self.image('x.png', 'PNG'))
+        self.assertEqual(seen, [True])
+
+    def test_failed_render_is_remembered(self):
+        product = Products.objects.create(name='Broken', picture=SimpleUploadedFile('broken.png', b'not an image'))
+        name = variant_name(product.picture.name, 'thumbnail')
+        self.assertEqual(variant_state.get(name), FAILED)
+        with mock.patch('api.images.render_variant') as render:
+            render_variants(product.picture)
+        render.assert_not_called()
+        self.assertIsNone(self.client.get('/api/products/').json()[0]['picture_variants']['thumbnail'])
+
+    def test_lost_race_leaves_no_suffixed_copy(self):
+        product = Products.objects.create(name='A', picture=self.image('x.png', 'PNG'))
+        name = variant_name(product.picture.name, 'thumbnail')
+        variant_state.clear()
+        # Another worker wrote the variant between our exists() and save().
+        real_exists = FileSystemStorage.exists
+        calls = []
+
+        def stale_exists(storage, path):
+            calls.append(path)
+            return False if len(calls) == 1 else real_exists(storage, path)
+
+        with mock.patch.object(FileSystemStorage, 'exists', autospec=True, side_effect=stale_exists):
+            render_variants(product.picture)
+        self.assertEqual(calls[0], name)
+        directory, filename = os.path.split(name)
+        self.assertEqual(default_storage.listdir(directory)[1], [filename])
+
+
+class ETagTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='ana')
+        Profile.objects.create(user=self.user, role='Customer')
+        self.product = Products.objects.create(name='Rice', price='50', quantity=10)
+        catalog_snapshot.clear()
+
+    def test_unchanged_resource_answers_304(self):
+        for url in [f'/api/profile/{self.user.id}/', '/api/products/', f'/api/product-details/{self.product.id}/']:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, url)
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(again.status_code, 304, url)
+
+    def test_missing_resource_has_no_etag(self):
+        response = self.client.get('/api/profile/999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_queryset_writes_change_the_etag(self):
+        before = self.client.get('/api/products/')['ETag']
+        deduct_stock(self.product.id, 1)  # UPDATE ... WHERE, no save() signal
+        self.assertNotEqual(self.client.get('/api/products/')['ETag'], before)
+
+        ride = Transportation.objects.create(customer=self.user)
+        url = f'/api/transport-map/{ride.id}/'
+        before = self.client.get(url)['ETag']
+        save_locations({ride.id: {'lat': 1.0, 'lng': 2.0}})
+        self.assertNotEqual(self.client.get(url)['ETag'], before)
+
+    def test_save_changes_the_etag(self):
+        url = f'/api/profile/{self.user.id}/'
+        before = self.client.get(url)['ETag']
+        self.user.first_name = 'Ana'
+        self.user.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=before).status_code, 200)
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        self.product = Products.objects.create(name='Rice', price='50', quantity=10)
+        catalog_snapshot.clear()
+
+    def quantities(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        return {row['id']: row['quantity'] for row in response.json()}
+
+    def test_snapshot_is_reused_until_a_write(self):
+        self.assertEqual(self.quantities(), {self.product.id: 10})
+        with CaptureQueriesContext(connection) as ctx:
+            self.quantities()
+        self.assertEqual(len(ctx.captured_queries), 1)  # the version read only
+
+        response = self.client.patch(
+            f'/api/products/{self.product.id}/deduct-quantity/', {'quantity': 3}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {self.product.id: 7})
+
+        other = Products.objects.create(name='Beans', price='30', quantity=4)
+        self.assertEqual(self.quantities(), {self.product.id: 7, other.id: 4})
+
+
+class CartCheckoutTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create(username='ana')
+        self.products = [
+            Products.objects.create(name=f'Item {index}', price='12.50', quantity=10)
+            for index in range(5)
+        ]
+        self.url = f'/api/deliveries/checkout/{self.customer.id}/'
+
+    def checkout(self, items):
+        return self.client.post(self.url, {'items': items, 'location': '14.6,121.0'}, content_type='application/json')
+
+    def test_five_item_cart_query_count(self):
+        items = [{'product_id': product.id, 'quantity': 2} for product in self.products]
+        self.assertEqual(self.checkout(items[:1]).status_code, 201)  # creates the counter row
+        # User check, product fetch, one conditional UPDATE per product, the
+        # version bump, the bulk insert and the counter update (10), plus the
+        # savepoints of the view's and deduct_stock_batch's atomic blocks.
+        with self.assertNumQueries(14):
+            response = self.checkout(items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 5)
+
+    def test_short_line_rolls_back_the_whole_cart(self):
+        short = self.products[-1]
+        items = [{'product_id': product.id, 'quantity': 2} for product in self.products[:-1]]
+        items.append({'product_id': short.id, 'quantity': 11})
+        response = self.checkout(items)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['product_id'], short.id)
+        self.assertFalse(Delivery.objects.exists())
+        self.assertEqual(set(Products.objects.values_list('quantity', flat=True)), {10})
+
+    def test_deliveries_store_line_totals(self):
+        response = self.checkout([
+            {'product_id': self.products[0].id, 'quantity': 3},
+            {'product_id': self.products[1].id, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['price'] for row in response.json()], ['37.50', '12.50'])
+        self.assertEqual(Products.objects.get(id=self.products[0].id).quantity, 7)
+
+    def test_unpriced_product_keeps_a_null_price(self):
+        unpriced = Products.objects.create(name='Sample', quantity=5)
+        response = self.checkout([{'product_id': unpriced.id, 'quantity': 2}])
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(Delivery.objects.get().price)  # as SubmitDeliveryView stores it
+
+    def test_checkout_bumps_catalog_version_once(self):
+        before = get_version('products')
+        self.checkout([{'product_id': product.id, 'quantity': 1} for product in self.products])
+        self.assertEqual(get_version('products'), before + 1)
+        self.checkout([{'product_id': self.products[0].id, 'quantity': 99}])
+        self.assertEqual(get_version('products'), before + 1)
+
+
+class PriceMigrationTests(TransactionTestCase):
+    migrate_from = [('api', '0027_view_filter_indexes')]
+    migrate_to = [('api', '0028_decimal_prices')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_text_prices_become_decimals(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        old_apps = executor.loader.project_state(self.migrate_from).apps
+        OldProducts = old_apps.get_model('api', 'Products')
+        texts = ['₱1,299', '1299 pesos', ' 22 ', '-50', 'free', '999999999', None]
+        ids = [OldProducts.objects.create(name=str(text), price=text).id for text in texts]
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        new_apps = executor.loader.project_state(self.migrate_to).apps
+        prices = new_apps.get_model('api', 'Products').objects.in_bulk(ids)
+        self.assertEqual(
+            [prices[pk].price for pk in ids],
+            [Decimal('1299.00'), Decimal('1299.00'), Decimal('22.00'), None, None, None, None],
+        )
+
+
+class RevenueSummaryTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create(username='ana')
+        self.rice = Products.objects.create(name='Rice', price='50', quantity=100)
+        self.eggs = Products.objects.create(name='Eggs', price='8', quantity=100)
+
+    def test_totals_from_one_query_per_tier(self):
+        url = f'/api/deliveries/submit/{self.customer.id}/{self.rice.id}/'
+        self.assertEqual(self.client.post(url, {'quantity': 3, 'rider': 'Ben'}).status_code, 201)
+        Delivery.objects.create(customer=self.customer, products=self.eggs, quantity=2, price='16', rider='Cy')
+        Transportation.objects.create(customer=self.customer, price='120', rider='Ben')
+
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/revenue/summary/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        today = timezone.localdate().isoformat()
+        self.assertEqual(data['per_day'], [{'day': today, 'deliveries': 166, 'transportations': 120, 'total': 286}])
+        self.assertEqual(data['per_rider'], [
+            {'rider': 'Ben', 'total': 270, 'count': 2},
+            {'rider': 'Cy', 'total': 16, 'count': 1},
+        ])
+        self.assertEqual(data['per_product'], [
+            {'product_id': self.rice.id, 'name': 'Rice', 'total': 150, 'quantity': 3, 'count': 1},
+            {'product_id': self.eggs.id, 'name': 'Eggs', 'total': 16, 'quantity': 2, 'count': 1},
+        ])
+
+    def test_filters(self):
+        Delivery.objects.create(customer=self.customer, products=self.rice, quantity=1, price='50', status='Arrived')
+        Delivery.objects.create(customer=self.customer, products=self.rice, quantity=1, price='50')
+        data = self.client.get('/api/revenue/summary/', {'status': 'Arrived', 'end': '2000-01-01'}).json()
+        self.assertEqual(data, {'per_day': [], 'per_rider': [], 'per_product': []})
+        data = self.client.get('/api/revenue/summary/', {'status': 'Arrived'}).json()
+        self.assertEqual(data['per_product'][0]['count'], 1)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        customer = User.objects.create(username='customer')
+        product = Products.objects.create(name='Rice', quantity=10)
+        Delivery.objects.bulk_create(Delivery(customer=customer, products=product) for _ in range(5))
+
+    def test_plain_list_unless_the_client_opts_in(self):
+        plain = self.client.get('/api/deliveries/').json()
+        self.assertIsInstance(plain, list)
+        self.assertEqual(len(plain), 5)
+
+        first = self.client.get('/api/deliveries/?page_size=2').json()
+        self.assertEqual(set(first), {'next', 'previous', 'results'})
+        self.assertEqual(len(first['results']), 2)
+        self.assertIsNone(first['previous'])
+
+        paged, url = [], '/api/deliveries/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            paged += [d['id'] for d in page['results']]
+            url = page['next']
+        self.assertEqual(paged, sorted((d['id'] for d in plain), reverse=True))  # newest first, no gaps
+
+    @override_settings(CURSOR_PAGINATION_BY_DEFAULT=True)
+    def test_setting_paginates_every_list(self):
+        page = self.client.get('/api/deliveries/').json()
+        self.assertEqual(len(page['results']), 5)
+
+
+class ChatHistoryTests(TestCase):
+    def setUp(self):
+        self.ana = User.objects.create(username='ana', first_name='Ana')
+        self.ben = User.objects.create(username='ben', first_name='Ben')
+        for n in range(6):
+            self.client.post(f'/api/chat/{self.ana.id}/{self.ben.id}/', {'sender_id': self.ana.id, 'content': f'm{n}'})
+        self.ids = list(Message.objects.order_by('id').values_list('id', flat=True))
+        self.url = f'/api/chat/{self.ana.id}/{self.ben.id}/'
+
+    def test_full_history_without_a_cursor(self):
+        room = self.client.get(self.url).json()
+        self.assertEqual([m['content'] for m in room['messages']], [f'm{n}' for n in range(6)])
+
+    def test_after_and_before_return_only_the_new_or_older_page(self):
+        after = self.client.get(f'{self.url}?after_id={self.ids[2]}').json()
+        self.assertEqual([m['id'] for m in after['messages']], self.ids[3:])
+        self.assertEqual(after['messages'][0]['sender_name'], 'Ana')
+
+        limited = self.client.get(f'{self.url}?after_id={self.ids[0]}&limit=2').json()
+        self.assertEqual([m['id'] for m in limited['messages']], self.ids[1:3])
+
+        before = self.client.get(f'{self.url}?before_id={self.ids[4]}&limit=2').json()
+        self.assertEqual([m['id'] for m in before['messages']], self.ids[2:4])
+
+        with self.assertNumQueries(2):  # room + joined messages
+            self.client.get(f'{self.url}?after_id={self.ids[-1]}')
+
+    def test_bad_cursors_are_rejected(self):
+        for query in ('after_id=abc', 'before_id=1.5', 'after_id=1&limit=x'):
+            self.assertEqual(self.client.get(f'{self.url}?{query}').status_code, 400, query)
+        self.assertEqual(self.client.get(f'/api/chat/{self.ana.id}/999/?after_id=1').status_code, 404)
+
+
+class ChatSocketTests(TestCase):
+    async def test_posted_message_is_pushed_to_room_socket(self):
+        sender = await User.objects.acreate(username='sender', first_name='Ana')
+        other = await User.objects.acreate(username='other')
+
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f'/ws/chat/{other.id}/{sender.id}/'
+        )
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        response = await sync_to_async(self.client.post)(
+            f'/api/chat/{sender.id}/{other.id}/', {'sender_id': sender.id, 'content': 'hello'}
+        )
+        self.assertEqual(response.status_code, 201)
+
+        pushed = await communicator.receive_json_from()
+        self.assertEqual(pushed['content'], 'hello')
+        self.assertEqual(pushed['sender_name'], 'Ana')
+        await communicator.disconnect()
+
+
+class RideTrackingTests(TestCase):
+    def setUp(self):
+        self.ride = Transportation.objects.create(customer=User.objects.create(username='customer'))
+        self.url = f'/api/transport-map/{self.ride.id}/location/'
+        self.addCleanup(tracker.finish, self.ride.id)
+
+    def location(self):
+        return Transportation.objects.values_list('current_location', flat=True).get(id=self.ride.id)
+
+    def test_points_are_buffered_and_flushed_periodically(self):
+        self.assertEqual(self.client.post(self.url, {'lat': 7.1, 'lng': 123.1}, content_type='application/json').status_code, 202)
+        self.assertEqual(self.location(), '7.1,123.1')  # first point is written
+        self.client.post(self.url, {'points': [{'lat': 7.2, 'lng': 123.2}, {'lat': 7.3, 'lng': 123.3}]}, content_type='application/json')
+        self.assertEqual(self.location(), '7.1,123.1')  # the rest waits for the interval
+        self.assertEqual(len(tracker.recent(self.ride.id)), 3)
+
+    def test_ending_the_ride_writes_the_last_point_and_forgets_it(self):
+        for lat in (7.1, 7.2):
+            self.client.post(self.url, {'lat': lat, 'lng': 123.0}, content_type='application/json')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/transport/{self.ride.id}/payment/', {'status': 'Cancelled'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.location(), '7.2,123.0')
+        self.assertFalse(tracker.is_tracking(self.ride.id))
+        self.assertEqual(self.client.post(self.url, {'lat': 7.3, 'lng': 123.0}, content_type='application/json').status_code, 404)
+
+    def test_silent_rides_are_evicted_with_their_last_point(self):
+        rides = RideTracker(flush_interval=15, stale_after=600)
+        with mock.patch('api.tracking.time.time', return_value=1000):
+            rides.record(1, [{'lat': 1, 'lng': 1}])
+            rides.record(1, [{'lat': 2, 'lng': 2}])
+            rides.record(2, [{'lat': 3, 'lng': 3}])
+        with mock.patch('api.tracking.time.time', return_value=1500):
+            rides.record(2, [{'lat': 4, 'lng': 4}])
+        with mock.patch('api.tracking.time.time', return_value=1700):
+            self.assertEqual(rides.evict_stale(), {1: {'lat': 2, 'lng': 2}})
+        self.assertFalse(rides.is_tracking(1))
+        self.assertTrue(rides.is_tracking(2))
+
+
+class StockDeductionTests(TransactionTestCase):
+    def test_parallel_deductions_never_oversell(self):
+        product = Products.objects.create(name='Rice', quantity=50)
+
+        def buy(_):
+            try:
+                return deduct_stock(product.id, 1)
+            except InsufficientStock:
+                return None
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(buy, range(300)))
+
+        succeeded = [r for r in results if r is not None]
+        self.assertEqual(len(succeeded), 50)
+        self.assertEqual(sorted(succeeded), list(range(50)))
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 0)
+
+    def test_batch_is_all_or_nothing(self):
+        rice = Products.objects.create(name='Rice', quantity=5)
+        eggs = Products.objects.create(name='Eggs', quantity=1)
+
+        with self.assertRaises(InsufficientStock):
+            deduct_stock_batch([(rice.id, 2), (eggs.id, 2)])
+        rice.refresh_from_db()
+        self.assertEqual(rice.quantity, 5)
+
+        self.assertEqual(deduct_stock_batch([(rice.id, 2), (eggs.id, 1), (rice.id, 1)]), {rice.id: 2, eggs.id: 0})
+
+    def test_fallback_without_update_returning(self):
+        # MariaDB: INSERT ... RETURNING but no UPDATE ... RETURNING.
+        product = Products.objects.create(name='Rice', quantity=3)
+        with mock.patch('api.stock._supports_update_returning', return_value=False), \
+                CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(deduct_stock(product.id, 2), 1)
+            with self.assertRaises(InsufficientStock):
+                deduct_stock(product.id, 2)
+        self.assertFalse(any('RETURNING' in query['sql'] for query in ctx.captured_queries))
+
+    def test_view_reports_missing_and_short_products(self):
+        product = Products.objects.create(name='Rice', quantity=1)
+        url = f'/api/products/{product.id}/deduct-quantity/'
+        response = self.client.patch(url, {'quantity': 1}, content_type='application/json')
+        self.assertEqual(response.json(), {'product_id': product.id, 'remaining_quantity': 0})
+        response = self.client.patch(url, {'quantity': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch('/api/products/999/deduct-quantity/', {'quantity': 1}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite profile only')
+class SqliteProfileTests(TransactionTestCase):
+    def test_pragmas_apply_to_new_connections(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        wrapper = type(connections['default'])({**connection.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')}, 'profile')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            pragmas = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                cursor.execute(f'PRAGMA {pragma}')
+                pragmas[pragma] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000, 'temp_store': 2})
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 0)
+
+    def test_transactions_begin_immediate(self):
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            User.objects.create(username='writer')
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_view_queries_use_indexes(self):
+        call_command('check_query_plans', stdout=StringIO())  # seeds its own sample users
+        self.assertFalse(User.objects.exists())
+
+    def test_view_without_a_sample_row_fails(self):
+        with mock.patch('api.management.commands.check_query_plans.keyset_page', side_effect=Http404):
+            with self.assertRaisesMessage(CommandError, 'no sample row'):
+                call_command('check_query_plans', stdout=StringIO())
+
+
+class StatusTransitionTests(TestCase):
+    def test_second_rider_to_accept_gets_a_conflict(self):
+        ride = Transportation.objects.create(customer=User.objects.create(username='customer'))
+
+        compare_and_set(Transportation, ride.id, JobStatus.PENDING, {'status': JobStatus.ACCEPTED, 'rider': 'Ben'})
+        with self.assertRaises(StatusConflict):
+            compare_and_set(Transportation, ride.id, JobStatus.PENDING, {'status': JobStatus.ACCEPTED, 'rider': 'Cy'})
+        ride.refresh_from_db()
+        self.assertEqual(ride.rider, 'Ben')
+
+    def test_backward_moves_are_rejected(self):
+        ride = Transportation.objects.create(customer=User.objects.create(username='customer'), status=JobStatus.ARRIVED)
+        with self.assertRaises(InvalidTransition):
+            compare_and_set(Transportation, ride.id, JobStatus.ARRIVED, {'status': JobStatus.PENDING})
+
+    def test_sequential_accepts_only_the_first_wins(self):
+        customer = User.objects.create(username='customer')
+        delivery = Delivery.objects.create(customer=customer, products=Products.objects.create(name='Rice'))
+        url = f'/api/deliveries/{delivery.id}/update-status/'
+        first = self.client.patch(url, {'status': 'Accepted', 'rider': 'Ben'}, content_type='application/json')
+        self.assertEqual(first.status_code, 200)
+        second = self.client.patch(url, {'status': 'Accepted', 'rider': 'Cy'}, content_type='application/json')
+        self.assertEqual(second.status_code, 409)
+        # A stale expected_status from the client doesn't reopen the claim.
+        third = self.client.patch(
+            url, {'status': 'Accepted', 'rider': 'Cy', 'expected_status': 'Accepted'}, content_type='application/json'
+        )
+        self.assertEqual(third.status_code, 409)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.rider, 'Ben')
+
+        ride = Transportation.objects.create(customer=customer)
+        url = f'/api/transport/{ride.id}/payment/'
+        self.assertEqual(self.client.patch(url, {'status': 'Accepted'}, content_type='application/json').status_code, 200)
+        self.assertEqual(self.client.patch(url, {'status': 'Accepted'}, content_type='application/json').status_code, 409)
+
+    def test_claim_needs_an_unassigned_job(self):
+        ride = Transportation.objects.create(customer=User.objects.create(username='customer'), rider='Ben')
+        with self.assertRaises(AlreadyClaimed):
+            compare_and_set(Transportation, ride.id, JobStatus.PENDING, {'status': JobStatus.ACCEPTED, 'rider': 'Cy'})
+        compare_and_set(Transportation, ride.id, JobStatus.PENDING, {'status': JobStatus.ACCEPTED, 'rider': 'Ben'})
+        with self.assertRaises(InvalidTransition):
+            compare_and_set(Transportation, ride.id, JobStatus.ACCEPTED, {'status': JobStatus.ACCEPTED, 'rider': 'Ben'})
+
+    def test_view_reports_conflict(self):
+        ride = Transportation.objects.create(customer=User.objects.create(username='customer'))
+        url = f'/api/transport/{ride.id}/payment/'
+        self.client.patch(url, {'status': 'Accepted'}, content_type='application/json')
+        response = self.client.patch(url, {'status': 'Accepted', 'expected_status': 'Pending'}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['current_status'], 'Accepted')
+
+
+    def test_row_deleted_before_the_update_is_a_404(self):
+        customer = User.objects.create(username='customer')
+        delivery = Delivery.objects.create(customer=customer, products=Products.objects.create(name='Rice'))
+        ride = Transportation.objects.create(customer=customer)
+
+        def delete_first(model, pk, *args):
+            model.objects.filter(pk=pk).delete()
+            return compare_and_set(model, pk, *args)
+
+        with mock.patch('api.views.compare_and_set', side_effect=delete_first):
+            gone = self.client.patch(f'/api/deliveries/{delivery.id}/update-status/', {'status': 'Arrived'}, content_type='application/json')
+            self.assertEqual(gone.status_code, 404)
+            self.assertEqual(gone.json(), {'error': 'Delivery not found'})
+            gone = self.client.patch(f'/api/transport/{ride.id}/payment/', {'status': 'Arrived'}, content_type='application/json')
+            self.assertEqual(gone.status_code, 404)
+
+class DispatchTests(TestCase):
+    def setUp(self):
+        rider_index.clear()
+        self.addCleanup(rider_index.clear)
+
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(7)
+        index = RiderIndex()
+        riders = {}
+        for rider_id in range(2000):
+            riders[rider_id] = (7.7 + rng.uniform(-0.1, 0.1), 123.3 + rng.uniform(-0.1, 0.1))
+            index.update(rider_id, *riders[rider_id], str(rider_id))
+
+        for _ in range(50):
+            lat, lng = 7.7 + rng.uniform(-0.1, 0.1), 123.3 + rng.uniform(-0.1, 0.1)
+            expected = sorted((haversine_km(lat, lng, *p), rider_id) for rider_id, p in riders.items())[:5]
+            self.assertEqual([r[1] for r in index.nearest(lat, lng, k=5)], [r[1] for r in expected])
+
+    def test_new_ride_goes_to_nearest_idle_rider(self):
+        for name, lat in (('Near', 7.7372), ('Far', 7.80)):
+            rider = User.objects.create(username=name, first_name=name)
+            Profile.objects.create(user=rider, role='Rider')
+            response = self.client.post(f'/api/riders/{rider.id}/position/', {'lat': lat, 'lng': 123.3259}, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+        customer = User.objects.create(username='customer')
+        response = self.client.post(
+            f'/api/transportation/{customer.id}/create/',
+            {'current_location': '7.7370,123.3260', 'destination': '7.7354,123.3238'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['rider'], 'Near')
+        self.assertEqual(Transportation.objects.get().rider, 'Near')
+
+        response = self.client.post(
+            f'/api/transportation/{customer.id}/create/',
+            {'current_location': '7.7370,123.3260'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['rider'], 'Far')
+
+    def test_assigned_rider_stays_out_of_the_pool_until_the_job_ends(self):
+        rider = User.objects.create(username='ben', first_name='Ben')
+        Profile.objects.create(user=rider, role='Rider')
+        position_url = f'/api/riders/{rider.id}/position/'
+        here = {'lat': 7.7372, 'lng': 123.3259}
+        self.client.post(position_url, here, content_type='application/json')
+
+        customer = User.objects.create(username='customer')
+        delivery = Delivery.objects.create(customer=customer, products=Products.objects.create(name='Rice'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/deliveries/{delivery.id}/update-status/', {'status': 'Accepted', 'rider': 'Ben'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(rider_index.get(rider.id))
+
+        # Position reports while busy don't put Ben back.
+        response = self.client.post(position_url, here, content_type='application/json')
+        self.assertEqual(response.json(), {'available': False, 'busy': True})
+        self.assertEqual(rider_index.nearest(7.7372, 123.3259), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            compare_and_set(Delivery, delivery.id, JobStatus.ACCEPTED, {'status': JobStatus.ARRIVED})
+        response = self.client.post(position_url, here, content_type='application/json')
+        self.assertEqual(response.json(), {'available': True})
+        self.assertEqual([r[2] for r in rider_index.nearest(7.7372, 123.3259)], ['Ben'])
+
+    def test_dispatched_rider_is_freed_by_a_saved_cancel(self):
+        index = RiderIndex()
+        index.update(1, 7.7372, 123.3259, 'Ben')
+        index.assign('Ben', ('api.transportation', 5))
+        self.assertFalse(index.update(1, 7.7372, 123.3259, 'Ben'))
+        self.assertEqual(len(index), 0)
+        index.release(('api.transportation', 5))
+        self.assertTrue(index.update(1, 7.7372, 123.3259, 'Ben'))
+
+        ride = Transportation.objects.create(customer=User.objects.create(username='customer'), rider='Cy')
+        self.assertTrue(rider_index.is_busy('Cy'))
+        ride.status = JobStatus.CANCELLED
+        ride.save()
+        self.assertFalse(rider_index.is_busy('Cy'))
+
+
+    def test_cart_lines_are_dispatched_and_tracked(self):
+        rider = User.objects.create(username='ben', first_name='Ben')
+        Profile.objects.create(user=rider, role='Rider')
+        self.client.post(f'/api/riders/{rider.id}/position/', {'lat': 7.7372, 'lng': 123.3259}, content_type='application/json')
+        customer = User.objects.create(username='customer')
+        rice = Products.objects.create(name='Rice', price='50.00', quantity=10)
+        url = f'/api/deliveries/checkout/{customer.id}/'
+
+        response = self.client.post(
+            url, {'items': [{'product_id': rice.id, 'quantity': 1}], 'location': '7.7354,123.3238'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()[0]['rider'], 'Ben')
+        self.assertEqual(Delivery.objects.get().rider, 'Ben')
+        self.assertTrue(rider_index.is_busy('Ben'))
+
+        self.client.post(
+            url, {'items': [{'product_id': rice.id, 'quantity': 1}], 'location': '7.7354,123.3238', 'rider': 'Cy'},
+            content_type='application/json',
+        )
+        self.assertTrue(rider_index.is_busy('Cy'))
+
+class FareQuoteTests(TestCase):
+    def test_vectorized_distances_match_scalar_haversine(self):
+        origins = [(7.7372, 123.3259), (7.70, 123.30), (7.80, 123.40)]
+        destinations = [(7.7354, 123.3238), (7.75, 123.35), (7.70, 123.30)]
+        pairs = haversine_pairs(origins, destinations)
+        matrix = distance_matrix(origins, destinations)
+        for i, origin in enumerate(origins):
+            self.assertAlmostEqual(pairs[i], haversine_km(*origin, *destinations[i]), places=6)
+            for j, destination in enumerate(destinations):
+                self.assertAlmostEqual(matrix[i, j], haversine_km(*origin, *destination), places=6)
+
+    def test_quote_endpoint(self):
+        response = self.client.post('/api/fares/quote/', {'trips': [
+            {'current_location': '7.7,123.3', 'destination': '7.8,123.4'},
+            {'current_location': '7.7,123.3', 'destination': '7.7,123.3'},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        long_trip, same_spot = response.json()
+        self.assertAlmostEqual(long_trip['distance_km'], 15.654, places=2)
+        self.assertEqual(same_spot, {'distance_km': 0.0, 'fare': '20.00'})
+        self.assertEqual(quote_trips([((7.7, 123.3), (7.8, 123.4))]), [long_trip])
+
+
+class RoadGraphTests(TestCase):
+    def load(self, features):
+        with tempfile.NamedTemporaryFile('w', suffix='.geojson', delete=False) as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f)
+        self.addCleanup(os.remove, f.name)
+        return RoadGraph.from_geojson(f.name)
+
+    @staticmethod
+    def road(*points, **properties):
+        return {
+            'type': 'Feature',
+            'properties': {'highway': 'residential', **properties},
+            'geometry': {'type': 'LineString', 'coordinates': [[lng, lat] for lat, lng in points]},
+        }
+
+    def test_route_follows_roads_around_a_gap(self):
+        # A square with the direct A-C road missing: A -> B -> C is the only way.
+        a, b, c = (7.730, 123.320), (7.730, 123.330), (7.740, 123.330)
+        graph = self.load([self.road(a, b), self.road(b, c)])
+
+        route = graph.route(a, c)
+        self.assertEqual(route['path'], [list(a), list(b), list(c)])
+        self.assertAlmostEqual(route['distance_km'], haversine_km(*a, *b) + haversine_km(*b, *c), places=2)
+        self.assertGreater(route['distance_km'], haversine_km(*a, *c))
+        self.assertGreater(route['duration_min'], 0)
+        self.assertIsNone(graph.route(a, (7.9, 123.9)))  # too far from any road
+
+    def test_oneway_roads_are_respected(self):
+        a, b = (7.730, 123.320), (7.730, 123.330)
+        graph = self.load([self.road(a, b, oneway='yes')])
+        self.assertIsNotNone(graph.route(a, b))
+        self.assertIsNone(graph.route(b, a))
+
+    def test_astar_matches_dijkstra_on_a_grid(self):
+        rng = random.Random(3)
+        features = []
+        for i in range(8):
+            for j in range(8):
+                here = (7.7 + i * 0.002, 123.3 + j * 0.002)
+                if i < 7 and rng.random() < 0.8:
+                    features.append(self.road(here, (here[0] + 0.002, here[1]), highway=rng.choice(['primary', 'residential'])))
+                if j < 7 and rng.random() < 0.8:
+                    features.append(self.road(here, (here[0], here[1] + 0.002), highway=rng.choice(['primary', 'residential'])))
+        graph = self.load(features)
+
+        for _ in range(20):
+            source, target = rng.randrange(len(graph)), rng.randrange(len(graph))
+            expected = self.dijkstra(graph, source, target)
+            result = graph.route_nodes(source, target)
+            if expected is None:
+                self.assertIsNone(result)
+            else:
+                self.assertAlmostEqual(result[1], expected, places=6)
+
+    def test_empty_graph_is_rejected_on_load(self):
+        with self.assertRaises(ValueError):
+            self.load([])
+        with self.assertRaises(ValueError):
+            self.load([{'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Point', 'coordinates': [123.3, 7.7]}}])
+
+    def test_new_road_file_does_not_reuse_old_quotes(self):
+        a, b, c = (7.730, 123.320), (7.730, 123.330), (7.740, 123.330)
+        straight = self.load([self.road(a, c)])
+        detour = self.load([self.road(a, b), self.road(b, c)])
+        self.assertNotEqual(straight.fingerprint, detour.fingerprint)
+
+        quotes = []
+        for graph in (straight, detour):
+            with mock.patch('api.fares.get_road_graph', return_value=graph), \
+                    mock.patch('api.fares.road_route', side_effect=graph.route):
+                quotes.append(quote_trips([(a, c)])[0]['distance_km'])
+        self.assertAlmostEqual(quotes[0], haversine_km(*a, *c), places=2)
+        self.assertGreater(quotes[1], quotes[0])
+
+    @staticmethod
+    def dijkstra(graph, source, target):
+        best = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap:
+            cost, n = heapq.heappop(heap)
+            if n == target:
+                return cost
+            if cost > best[n]:
+                continue
+            for e in range(graph.indptr[n], graph.indptr[n + 1]):
+                m = int(graph.indices[e])
+                if cost + graph.seconds[e] < best.get(m, float('inf')):
+                    best[m] = cost + graph.seconds[e]
+                    heapq.heappush(heap, (best[m], m))
+        return None
+
+
+class ArchiveTests(TestCase):
+    def test_old_arrived_deliveries_move_to_archive_and_stay_listed(self):
+        customer = User.objects.create(username='customer')
+        product = Products.objects.create(name='Rice', quantity=10)
+        Delivery.objects.bulk_create(
+            Delivery(customer=customer, products=product, status=JobStatus.ARRIVED) for _ in range(7)
+        )
+        pending = Delivery.objects.create(customer=customer, products=product)
+        old_ids = list(Delivery.objects.filter(status=JobStatus.ARRIVED).order_by('id').values_list('id', flat=True)[:5])
+        Delivery.objects.filter(id__in=old_ids).update(delivery_issued=timezone.now() - timezone.timedelta(days=90))
+        Delivery.objects.filter(id=pending.id).update(delivery_issued=timezone.now() - timezone.timedelta(days=90))
+
+        call_command('archive_jobs', days=30, batch_size=2, stdout=StringIO())
+
+        self.assertEqual(sorted(ArchivedDelivery.objects.values_list('id', flat=True)), old_ids)
+        self.assertEqual(Delivery.objects.count(), 3)  # two recent arrivals + the old pending one
+
+        arrived = [d['id'] for d in self.client.get('/api/deliveries/arrived/').json()]
+        self.assertEqual(arrived, sorted(arrived))  # legacy ascending-id order
+
+        paged, url = [], '/api/deliveries/arrived/?page_size=3'
+        while url:
+            page = self.client.get(url).json()
+            paged += [d['id'] for d in page['results']]
+            url = page['next']
+        self.assertEqual(sorted(paged), arrived)
+
+        history = [d['id'] for d in self.client.get(f'/api/deliveries/user/{customer.id}/').json()]
+        self.assertEqual(len(history), 8)
+        self.assertEqual(len(self.client.get('/api/deliveries/').json()), 8)
+
+    def test_arrived_rides_keep_ascending_id_order(self):
+        customer = User.objects.create(username='customer')
+        rides = Transportation.objects.bulk_create(
+            Transportation(customer=customer, status=JobStatus.ARRIVED) for _ in range(3)
+        )
+        listed = [r['id'] for r in self.client.get('/api/transportations/arrived/').json()]
+        self.assertEqual(listed, [ride.id for ride in rides])
+
+    def test_batch_query_count_does_not_grow_with_rows(self):
+        customer = User.objects.create(username='customer')
+        product = Products.objects.create(name='Rice', quantity=10)
+        for price in range(6):
+            self.old_arrival(customer, product, price)
+        before = dashboard_counts()
+        cutoff = timezone.now() - timezone.timedelta(days=30)
+        with CaptureQueriesContext(connection) as small:
+            archive_batch(Delivery, cutoff, batch_size=2)
+        with CaptureQueriesContext(connection) as large:
+            archive_batch(Delivery, cutoff, batch_size=4)
+        self.assertEqual(len(large), len(small))
+        self.assertFalse(Delivery.objects.exists())
+        self.assertEqual(dashboard_counts(), before)
+
+    def old_arrival(self, customer, product, price):
+        delivery = Delivery.objects.create(customer=customer, products=product, status=JobStatus.ARRIVED, price=price, quantity=1)
+        Delivery.objects.filter(id=delivery.id).update(delivery_issued=timezone.now() - timezone.timedelta(days=90))
+        return delivery
+
+    def test_id_clash_rolls_back_instead_of_losing_rows(self):
+        customer = User.objects.create(username='customer')
+        product = Products.objects.create(name='Rice', quantity=10)
+        clash = self.old_arrival(customer, product, '10')
+        fine = self.old_arrival(customer, product, '20')
+        ArchivedDelivery.objects.create(
+            id=clash.id, customer=customer, products=product, delivery_issued=timezone.now(), price='999'
+        )
+
+        with self.assertRaisesMessage(CommandError, str(clash.id)):
+            call_command('archive_jobs', days=30, stdout=StringIO())
+        self.assertEqual(set(Delivery.objects.values_list('id', flat=True)), {clash.id, fine.id})
+        self.assertEqual(ArchivedDelivery.objects.get(id=clash.id).price, Decimal('999'))
+
+    def test_revenue_counts_archived_jobs(self):
+        customer = User.objects.create(username='customer')
+        product = Products.objects.create(name='Rice', quantity=10)
+        self.old_arrival(customer, product, '40')
+        Delivery.objects.create(customer=customer, products=product, price='10', quantity=1)
+        before = self.client.get('/api/revenue/summary/').json()
+        call_command('archive_jobs', days=30, stdout=StringIO())
+        self.assertEqual(ArchivedDelivery.objects.count(), 1)
+        after = self.client.get('/api/revenue/summary/').json()
+        self.assertEqual(after['per_product'], before['per_product'])
+        self.assertEqual(sum(day['total'] for day in after['per_day']), 50)
+
+
+class DashboardCounterTests(TestCase):
+    def test_counters_follow_writes_and_match_a_recount(self):
+        customer = User.objects.create(username='customer')
+        rider = User.objects.create(username='rider', first_name='Ben')
+        Profile.objects.create(user=rider, role='Rider')
+        product = Products.objects.create(name='Rice', quantity=10)
+
+        self.client.patch(f'/api/users/{rider.id}/update-status/', {'status': 'Approved'}, content_type='application/json')
+        self.client.post(
+            f'/api/deliveries/checkout/{customer.id}/',
+            {'items': [{'product_id': product.id, 'quantity': 2}, {'product_id': product.id, 'quantity': 1}]},
+            content_type='application/json',
+        )
+        first, second = Delivery.objects.order_by('id')
+        self.client.patch(f'/api/deliveries/{first.id}/update-status/', {'status': 'Arrived'}, content_type='application/json')
+        self.client.delete(f'/api/deliveries/{second.id}/delete/')
+        ride = Transportation.objects.create(customer=customer)
+        compare_and_set(Transportation, ride.id, JobStatus.PENDING, {'status': JobStatus.ACCEPTED})
+        Delivery.objects.filter(id=first.id).update(delivery_issued=timezone.now() - timezone.timedelta(days=90))
+        call_command('archive_jobs', days=30, stdout=StringIO())
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/stats/')
+        stats = response.json()
+        self.assertEqual(stats['deliveries']['Arrived'], 1)
+        self.assertEqual(stats['deliveries']['Pending'], 0)
+        self.assertEqual(stats['transportations']['Accepted'], 1)
+        self.assertEqual(stats['rides_today'], 1)
+        self.assertEqual(stats['riders'], {'Approved': 1})
+
+        rebuild_counters()
+        self.assertEqual(dashboard_counts(), stats)
+
+        customer.delete()
+        self.assertEqual(sum(dashboard_counts()['deliveries'].values()), 0)
+        self.assertEqual(dashboard_counts()['rides_today'], 0)
+
+    def test_save_moves_counters_in_one_update_under_a_transaction(self):
+        ride = Transportation.objects.create(customer=User.objects.create(username='customer'))
+        ride.status = JobStatus.ACCEPTED
+        with CaptureQueriesContext(connection) as ctx:
+            ride.save()
+        counter_updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "api_dashboardcounter"')]
+        self.assertEqual(len(counter_updates), 1)
+        self.assertTrue(ctx.captured_queries[0]['sql'].startswith('SAVEPOINT'))  # read, write and count together
+        self.assertEqual(dashboard_counts()['transportations']['Pending'], 0)
+        self.assertEqual(dashboard_counts()['transportations']['Accepted'], 1)
+
+
+    def test_failed_counter_move_rolls_back_the_status_update(self):
+        ride = Transportation.objects.create(customer=User.objects.create(username='customer'), rider='Ben')
+        with mock.patch('api.transitions.count_status_change', side_effect=DatabaseError):
+            with mock.patch('api.transitions.track_assignment') as track, self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(DatabaseError):
+                    compare_and_set(Transportation, ride.id, JobStatus.PENDING, {'status': JobStatus.CANCELLED})
+        ride.refresh_from_db()
+        self.assertEqual(ride.status, JobStatus.PENDING)
+        track.assert_not_called()
+        self.assertEqual(dashboard_counts()['transportations']['Pending'], 1)
+
+class CounterMigrationTests(TransactionTestCase):
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_seed_matches_a_rebuild(self):
+        before = [('api', '0030_archive_tables')]
+        executor = MigrationExecutor(connection)
+        executor.migrate(before)
+        old_apps = executor.loader.project_state(before).apps
+        customer = old_apps.get_model('auth', 'User').objects.create(username='customer')
+        product = old_apps.get_model('api', 'Products').objects.create(name='Rice')
+        old_apps.get_model('api', 'Delivery').objects.create(customer=customer, products=product, status='Arrived')
+        old_apps.get_model('api', 'ArchivedDelivery').objects.create(
+            id=99, customer=customer, products=product, status='Arrived', delivery_issued=timezone.now()
+        )
+        old_apps.get_model('api', 'Transportation').objects.create(customer=customer)
+        old_apps.get_model('api', 'Profile').objects.create(user=customer, role='Rider')
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([('api', '0031_dashboard_counters')])
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        seeded = dashboard_counts()
+        self.assertEqual(seeded['deliveries']['Arrived'], 2)
+        self.assertEqual(seeded['transportations']['Pending'], 1)
+        self.assertEqual(seeded['rides_today'], 1)
+        self.assertEqual(seeded['riders'], {'Pending': 1})
+        rebuild_counters()
+        self.assertEqual(dashboard_counts(), seeded)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def test_token_requests_skip_the_user_lookup(self):
+        user = User.objects.create_user(username='09170000000', password='secret', first_name='Ana')
+        token = self.client.post('/api/login/', {'username': '09170000000', 'password': 'secret'}).json()['access']
+        user_rows.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'auth_user' in q['sql']])
+
+        request_user = response.wsgi_request.user
+        self.assertEqual((request_user.id, request_user.username, request_user.first_name), (user.id, '09170000000', 'Ana'))
+        with self.assertNumQueries(1):
+            self.assertEqual(request_user.full_user, user)
+            self.assertEqual(user_rows.get(user.id), user)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserImportTests(TestCase):
+    CSV = (
+        "username,password,first_name,email,role\n"
+        "09170000001,pw1,Ana,,\n"
+        "09170000002,pw2,Ben,,Customer\n"
+        "09170000001,pw3,Dup,,\n"
+        "existing,pw4,Old,,\n"
+        ",pw5,,,\n"
+    )
+
+    def test_command_hashes_in_a_pool_and_reports_duplicates(self):
+        User.objects.create(username='existing')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.CSV)
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_users', f.name, workers=2, chunk_size=2, stdout=out)
+
+        self.assertIn('created 2 users, skipped 2 duplicates and 1 invalid rows', out.getvalue())
+        ana = User.objects.get(username='09170000001')
+        self.assertTrue(ana.check_password('pw1'))
+        self.assertEqual((ana.first_name, ana.last_name, ana.profile.role), ('Ana', 'Pending', 'Rider'))
+        self.assertEqual(Profile.objects.get(user__username='09170000002').role, 'Customer')
+        self.assertEqual(dashboard_counts()['riders'], {'Pending': 1})
+
+    def test_rows_get_the_signup_validators(self):
+        rows = [
+            (2, {'username': 'ana lopez', 'password': 'pw', 'first_name': '', 'email': '', 'role': ''}),
+            (3, {'username': 'ben', 'password': 'pw', 'first_name': '', 'email': 'not-an-email', 'role': ''}),
+            (4, {'username': 'x' * 151, 'password': 'pw', 'first_name': '', 'email': '', 'role': ''}),
+            (5, {'username': 'cy', 'password': 'pw', 'first_name': 'Cy', 'email': 'cy@example.com', 'role': ''}),
+        ]
+        report = import_users(rows, workers=1)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([(row['line'], row['error'].split(':')[0]) for row in report['invalid']],
+                         [(2, 'username'), (3, 'email'), (4, 'username')])
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['cy'])
+
+    def test_endpoint_is_staff_only(self):
+        User.objects.create_user(username='admin', password='secret', is_staff=True)
+        User.objects.create_user(username='rider', password='secret')
+
+        def upload(username):
+            token = self.client.post('/api/login/', {'username': username, 'password': 'secret'}).json()['access']
+            return self.client.post(
+                '/api/users/import/',
+                {'file': SimpleUploadedFile('users.csv', self.CSV.encode())},
+                HTTP_AUTHORIZATION=f'Bearer {token}',
+            )
+
+        self.assertEqual(upload('rider').status_code, 403)
+        response = upload('admin')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual([d['line'] for d in response.json()['duplicates']], [4])
+
+    def test_stale_staff_claims_are_refused(self):
+        admin = User.objects.create_user(username='admin', password='secret', is_staff=True)
+        token = self.client.post('/api/login/', {'username': 'admin', 'password': 'secret'}).json()['access']
+
+        def upload():
+            return self.client.post(
+                '/api/users/import/',
+                {'file': SimpleUploadedFile('users.csv', self.CSV.encode())},
+                HTTP_AUTHORIZATION=f'Bearer {token}',
+            )
+
+        admin.is_staff = False
+        admin.save()
+        self.assertEqual(upload().status_code, 403)  # token still says is_staff
+        admin.is_staff, admin.is_active = True, False
+        admin.save()
+        self.assertEqual(upload().status_code, 403)
+        admin.delete()
+        self.assertEqual(upload().status_code, 403)
+        self.assertEqual(User.objects.count(), 0)
+
+    @override_settings(USER_IMPORT_WORKERS=2)
+    def test_endpoint_shares_one_bounded_pool(self):
+        User.objects.create_user(username='admin', password='secret', is_staff=True)
+        token = self.client.post('/api/login/', {'username': 'admin', 'password': 'secret'}).json()['access']
+        with mock.patch('api.onboarding._pool', None), \
+                mock.patch('api.onboarding.ProcessPoolExecutor', wraps=ProcessPoolExecutor) as started:
+            for index in range(2):
+                csv_text = f"username,password\nuser{index},pw\n"
+                response = self.client.post(
+                    '/api/users/import/',
+                    {'file': SimpleUploadedFile('users.csv', csv_text.encode())},
+                    HTTP_AUTHORIZATION=f'Bearer {token}',
+                )
+                self.assertEqual(response.json()['created'], 1)
+            pool = onboarding._pool
+        self.addCleanup(pool.shutdown)
+        started.assert_called_once()
+        self.assertEqual(started.call_args.kwargs['max_workers'], 2)
+
+    def test_username_taken_after_the_preload_is_reported(self):
+        rows = [(2, {'username': 'ana', 'password': 'pw', 'first_name': '', 'email': '', 'role': ''}),
+                (3, {'username': 'ben', 'password': 'pw', 'first_name': '', 'email': '', 'role': ''})]
+        real_insert = onboarding._insert_rows
+
+        def race(*args):
+            # Someone registers "ana" between the preload and our insert.
+            if not User.objects.filter(username='ana').exists():
+                User.objects.create(username='ana')
+            return real_insert(*args)
+
+        with mock.patch('api.onboarding._insert_rows', side_effect=race):
+            report = import_users(rows, workers=1)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['duplicates'], [{'line': 2, 'username': 'ana'}])
+        self.assertTrue(User.objects.filter(username='ben').exists())
+
+
+class ExportTests(TestCase):
+    def test_exports_stream_both_tiers_in_id_order(self):
+        customer = User.objects.create(username='customer', first_name='Ana')
+        product = Products.objects.create(name='Rice', quantity=10)
+        first = Delivery.objects.create(customer=customer, products=product, status=JobStatus.ARRIVED, price='12.50')
+        Delivery.objects.create(customer=customer, products=product)
+        Delivery.objects.filter(id=first.id).update(delivery_issued=timezone.now() - timezone.timedelta(days=90))
+        call_command('archive_jobs', days=30, stdout=StringIO())
+        Delivery.objects.create(customer=customer, products=product, status=JobStatus.ARRIVED)
+
+        response = self.client.get('/api/deliveries/export/')
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([r['id'] for r in rows], sorted(r['id'] for r in rows))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual((rows[0]['customer'], rows[0]['product'], rows[0]['price']), ('Ana', 'Rice', '12.50'))
+
+        response = self.client.get('/api/deliveries/export/?type=csv&status=Arrived')
+        table = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(table[0][:3], ['id', 'delivery_issued', 'status'])
+        self.assertEqual([row[2] for row in table[1:]], ['Arrived', 'Arrived'])
+
+        self.assertEqual(self.client.get('/api/transportations/export/?type=xlsx').status_code, 400)
+
+    async def test_asgi_export_streams_batches(self):
+        customer = await User.objects.acreate(username='customer', first_name='Ana')
+        product = await Products.objects.acreate(name='Rice', quantity=10)
+        await Delivery.objects.abulk_create(Delivery(customer=customer, products=product) for _ in range(5))
+
+        with mock.patch('api.exports.CHUNK_SIZE', 2):
+            response = await self.async_client.get('/api/deliveries/export/')
+            self.assertTrue(response.is_async)  # a sync iterator would be read whole before sending
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(b''.join(chunks).decode().splitlines()), 5)
+
+
+class InboxTests(TestCase):
+    def test_inbox_has_previews_and_unread_counts_in_one_query(self):
+        me = User.objects.create(username='me', first_name='Me')
+        partners = [User.objects.create(username=f'p{i}', first_name=f'P{i}') for i in range(5)]
+        for i, partner in enumerate(partners):
+            for n in range(i + 1):
+                self.client.post(f'/api/chat/{me.id}/{partner.id}/', {'sender_id': partner.id, 'content': f'hi {n}'})
+        self.client.post(f'/api/chat/{me.id}/{partners[0].id}/', {'sender_id': me.id, 'content': 'x' * 300})
+
+        with self.assertNumQueries(1):
+            rooms = self.client.get(f'/api/chat/users/{me.id}/').json()
+        self.assertEqual([r['id'] for r in rooms], [partners[0].id] + [p.id for p in reversed(partners[1:])])
+        self.assertEqual(rooms[0]['last_message']['sender_id'], me.id)
+        self.assertEqual(len(rooms[0]['last_message']['content']), 120)
+        self.assertEqual(rooms[0]['unread_count'], 0)  # replying marks the room read
+        self.assertEqual({r['id']: r['unread_count'] for r in rooms[1:]}, {p.id: i + 1 for i, p in enumerate(partners) if i})
+
+        response = self.client.post(f'/api/chat/{partners[4].id}/{me.id}/read/', {'user_id': me.id})
+        self.assertEqual(response.status_code, 204)
+        rooms = self.client.get(f'/api/chat/users/{me.id}/').json()
+        self.assertEqual(rooms[1]['unread_count'], 0)
+        partner_view = self.client.get(f'/api/chat/users/{partners[4].id}/').json()
+        self.assertEqual(partner_view[0]['unread_count'], 0)
+
+    def test_inbox_does_not_join_messages(self):
+        me = User.objects.create(username='me', first_name='Me')
+        partner = User.objects.create(username='p', first_name='P')
+        self.client.post(f'/api/chat/{me.id}/{partner.id}/', {'sender_id': partner.id, 'content': 'hello'})
+        with CaptureQueriesContext(connection) as queries:
+            rooms = self.client.get(f'/api/chat/users/{me.id}/').json()
+        self.assertNotIn('JOIN "api_message"', queries[0]['sql'])
+        self.assertNotIn('content', queries[0]['sql'])
+        self.assertEqual(rooms[0]['last_message']['sender_id'], partner.id)
+
+    def test_read_marker_stays_within_the_room(self):
+        me = User.objects.create(username='me', first_name='Me')
+        partner = User.objects.create(username='p', first_name='P')
+        other = User.objects.create(username='o', first_name='O')
+        self.client.post(f'/api/chat/{me.id}/{partner.id}/', {'sender_id': partner.id, 'content': 'hi'})
+        self.client.post(f'/api/chat/{me.id}/{other.id}/', {'sender_id': other.id, 'content': 'elsewhere'})
+        room = Message.objects.get(sender=partner).room
+        foreign = Message.objects.exclude(room=room).get()
+
+        response = self.client.post(f'/api/chat/{partner.id}/{me.id}/read/', {'user_id': me.id, 'message_id': foreign.id})
+        self.assertEqual(response.status_code, 400)
+        unread = {r['id']: r['unread_count'] for r in self.client.get(f'/api/chat/users/{me.id}/').json()}
+        self.assertEqual(unread[partner.id], 1)
+
+        mark_read(room, me.id, room.last_message_id)
+        later = Message.objects.create(room=room, sender=partner, content='not recorded yet')
+        mark_read(room, partner.id, later.id)
+        room.refresh_from_db()
+        self.assertEqual(room.user1_last_read if room.user1_id == partner.id else room.user2_last_read, room.last_message_id)
+
+
+class UserSearchTests(TestCase):
+    def test_prefix_search_is_ranked_and_follows_renames(self):
+        maria = User.objects.create(username='09171111111', first_name='María Clara')
+        mario = User.objects.create(username='09172222222', first_name='Mario')
+        mar = User.objects.create(username='09173333333', first_name='Mar')
+        User.objects.create(username='09174444444', first_name='Clarissa')
+
+        with self.assertNumQueries(2):
+            results = self.client.get('/api/users/search/?q=MAR').json()
+        self.assertEqual([r['id'] for r in results], [mar.id, mario.id, maria.id])
+
+        self.assertEqual([r['first_name'] for r in self.client.get('/api/users/search/?q=clar').json()], ['Clarissa', 'María Clara'])
+        self.assertEqual([r['id'] for r in self.client.get('/api/users/search/?q=0917222').json()], [mario.id])
+        self.assertEqual(len(self.client.get('/api/users/search/?q=ma&limit=1').json()), 1)
+
+        mario.first_name = 'Ramon'
+        mario.save()
+        self.assertNotIn(mario.id, [r['id'] for r in self.client.get('/api/users/search/?q=mar').json()])
+        self.assertEqual(self.client.get('/api/users/search/?q=').json(), [])
+
+
+
+class SearchTermMigrationTests(TransactionTestCase):
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_backfill_does_not_use_the_live_tokeniser(self):
+        before = [('api', '0032_room_inbox_fields')]
+        executor = MigrationExecutor(connection)
+        executor.migrate(before)
+        old_apps = executor.loader.project_state(before).apps
+        user_id = old_apps.get_model('auth', 'User').objects.create(username='09171111111', first_name='María  Clara').id
+
+        executor = MigrationExecutor(connection)
+        with mock.patch('api.search.terms_for', side_effect=AssertionError), \
+                mock.patch('api.search.normalize', side_effect=AssertionError):
+            executor.migrate([('api', '0033_user_search_terms')])
+        executor = MigrationExecutor(connection)
+        rows = executor.loader.project_state([('api', '0033_user_search_terms')]).apps.get_model('api', 'UserSearchTerm')
+        self.assertEqual(
+            sorted(rows.objects.filter(user_id=user_id).values_list('term', 'source', 'position')),
+            [('09171111111', 'username', 0), ('clara', 'name', 1), ('maria clara', 'name', 0)],
+        )
+
+class ProductSearchTests(TestCase):
+    def test_search_and_filters_run_in_the_database(self):
+        milk = Products.objects.create(name='Chocolate Milk', type='Drinks', quantity=5)
+        Products.objects.create(name='Milk Powder', type='Grocery', quantity=0)
+        Products.objects.create(name='Café Latte', type='Drinks', quantity=3, status='Unavailable')
+
+        def ids(query):
+            return sorted(p['id'] for p in self.client.get(f'/api/products/?{query}').json())
+
+        self.assertEqual(len(ids('q=milk')), 2)
+        self.assertEqual(ids('q=choc mil'), [milk.id])
+        self.assertEqual(len(ids('q=cafe')), 1)
+        self.assertEqual(ids('q=milk&in_stock=true'), [milk.id])
+        self.assertEqual(len(ids('type=Drinks')), 2)
+        self.assertEqual(ids('type=Drinks&status=Available'), [milk.id])
+
+        Products.objects.filter(id=milk.id).update(name='Strawberry Milk')
+        self.assertEqual(ids('q=choc'), [])
+        self.assertEqual(ids('q=straw'), [milk.id])
+        deduct_stock(milk.id, 5)
+        self.assertEqual(ids('q=straw&in_stock=1'), [])
+        self.assertEqual(self.client.get('/api/products/?in_stock=maybe').status_code, 400)
+
+    def test_filtered_urls_get_their_own_etags(self):
+        Products.objects.create(name='Rice', type='Grocery', quantity=1)
+        all_products = self.client.get('/api/products/')
+        drinks = self.client.get('/api/products/?type=Drinks')
+        self.assertNotEqual(all_products['ETag'], drinks['ETag'])
+        cached = self.client.get('/api/products/?type=Drinks', HTTP_IF_NONE_MATCH=drinks['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite FTS5 only')
+class ProductSearchMigrationTests(TransactionTestCase):
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_migration_builds_and_backfills_the_index_on_its_own(self):
+        before = [('api', '0033_user_search_terms')]
+        executor = MigrationExecutor(connection)
+        executor.migrate(before)
+        product = executor.loader.project_state(before).apps.get_model('api', 'Products').objects.create(name='Chocolate Milk')
+
+        executor = MigrationExecutor(connection)
+        with mock.patch.dict('sys.modules', {'api.catalog': None}):  # no live helpers
+            executor.migrate([('api', '0034_product_search')])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM api_products_fts WHERE api_products_fts MATCH 'choc*'")
+            self.assertEqual(cursor.fetchall(), [(product.id,)])
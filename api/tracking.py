@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .models import JobStatus, Transportation
+from .versions import bump_model_version
+
+# Statuses after which a ride gets no more GPS points.
+RIDE_OVER = {JobStatus.ARRIVED, JobStatus.RECEIVED, JobStatus.CANCELLED}
+
+
+class RideTracker:
+    """
+    Latest GPS points per active ride, kept in memory.
+
+    Each ride gets a bounded deque so memory stays flat no matter how often
+    the rider app reports. The database only sees a snapshot of the newest
+    point every ``flush_interval`` seconds (see ``record``); the point still
+    pending when a ride ends (``finish``) or goes silent for ``stale_after``
+    seconds (``evict_stale``) is handed back so the caller can write it.
+    """
+
+    def __init__(self, max_points=100, flush_interval=15, stale_after=3600):
+        self.max_points = max_points
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self._tracks = {}
+        self._last_flush = {}
+        self._last_seen = {}
+        self._pending = {}  # ride -> newest point not yet written to the database
+        self._last_sweep = 0
+        self._lock = threading.Lock()
+
+    def is_tracking(self, ride_id):
+        return ride_id in self._tracks
+
+    def record(self, ride_id, points):
+        """Append points and return ``(latest_point, flush_due)``."""
+        now = time.time()
+        with self._lock:
+            track = self._tracks.get(ride_id)
+            if track is None:
+                track = self._tracks[ride_id] = deque(maxlen=self.max_points)
+            track.extend(points)
+            latest = track[-1]
+            self._last_seen[ride_id] = now
+            flush_due = now - self._last_flush.get(ride_id, 0) >= self.flush_interval
+            if flush_due:
+                self._last_flush[ride_id] = now
+                self._pending.pop(ride_id, None)
+            else:
+                self._pending[ride_id] = latest
+        return latest, flush_due
+
+    def recent(self, ride_id, limit=None):
+        with self._lock:
+            track = list(self._tracks.get(ride_id, ()))
+        return track[-limit:] if limit else track
+
+    def finish(self, ride_id):
+        """Forget the ride; returns its unwritten newest point, or None."""
+        with self._lock:
+            return self._forget(ride_id)
+
+    def evict_stale(self):
+        """
+        Forget rides with no point for ``stale_after`` seconds (checked at
+        most once a minute). Returns ``{ride_id: unwritten point}``.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < min(60, self.stale_after):
+                return {}
+            self._last_sweep = now
+            stale = [ride_id for ride_id, seen in self._last_seen.items() if now - seen >= self.stale_after]
+            pending = {ride_id: self._forget(ride_id) for ride_id in stale}
+        return {ride_id: point for ride_id, point in pending.items() if point is not None}
+
+    def _forget(self, ride_id):
+        self._tracks.pop(ride_id, None)
+        self._last_flush.pop(ride_id, None)
+        self._last_seen.pop(ride_id, None)
+        return self._pending.pop(ride_id, None)
+
+
+tracker = RideTracker(
+    max_points=getattr(settings, 'RIDE_TRACK_MAX_POINTS', 100),
+    flush_interval=getattr(settings, 'RIDE_TRACK_FLUSH_SECONDS', 15),
+    stale_after=getattr(settings, 'RIDE_TRACK_STALE_SECONDS', 3600),
+)
+
+
+def save_locations(points):
+    """Write ``{ride_id: point}`` to Transportation.current_location."""
+    for ride_id, point in points.items():
+        Transportation.objects.filter(id=ride_id).update(current_location=f"{point['lat']},{point['lng']}")
+    if points:
+        bump_model_version(Transportation)
+
+
+def finish_ride(ride_id):
+    """Called when a ride reaches a RIDE_OVER status: write its last point and drop it."""
+    point = tracker.finish(ride_id)
+    if point is not None:
+        save_locations({ride_id: point})
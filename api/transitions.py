@@ -0,0 +1,105 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+
+from .counters import count_status_change
+from .dispatch import JOB_OVER, track_assignment
+from .models import JobStatus, Transportation
+from .tracking import RIDE_OVER, finish_ride
+from .versions import bump_model_version
+
+# Allowed status moves. Jobs go forward (the app often skips straight to
+# Arrived) and can be cancelled until they arrive.
+TRANSITIONS = {
+    JobStatus.PENDING: {JobStatus.ACCEPTED, JobStatus.ON_THE_WAY, JobStatus.ARRIVED, JobStatus.RECEIVED, JobStatus.CANCELLED},
+    JobStatus.ACCEPTED: {JobStatus.ON_THE_WAY, JobStatus.ARRIVED, JobStatus.RECEIVED, JobStatus.CANCELLED},
+    JobStatus.ON_THE_WAY: {JobStatus.ARRIVED, JobStatus.RECEIVED, JobStatus.CANCELLED},
+    JobStatus.ARRIVED: {JobStatus.RECEIVED},
+    JobStatus.RECEIVED: set(),
+    JobStatus.CANCELLED: set(),
+}
+
+class InvalidTransition(Exception):
+    def __init__(self, current, new):
+        super().__init__(f"Cannot move from {current} to {new}")
+        self.current = current
+        self.new = new
+
+
+class StatusConflict(Exception):
+    """The row's status was no longer the expected one when the update ran."""
+
+    def __init__(self, expected, current):
+        super().__init__(f"Status changed from {expected} to {current}")
+        self.expected = expected
+        self.current = current
+
+
+class AlreadyClaimed(StatusConflict):
+    """Another rider holds the job this rider tried to accept."""
+
+    def __init__(self, current, rider):
+        Exception.__init__(self, f"Job is already taken by {rider}")
+        self.expected = current
+        self.current = current
+        self.rider = rider
+
+
+def can_transition(current, new):
+    # No self-moves: a second Accepted must not look like a no-op success.
+    return new in TRANSITIONS.get(current, ())
+
+
+def expected_status(new, requested, current):
+    """
+    The status a conditional update should start from. Accepting a job is
+    only ever a move out of Pending, so claims ignore what the client sent;
+    other moves use the client's ``expected_status`` or the status just read.
+    """
+    if new == JobStatus.ACCEPTED:
+        return JobStatus.PENDING
+    return requested or current
+
+
+def compare_and_set(model, pk, expected, changes):
+    """
+    ``UPDATE ... SET <changes> WHERE id = pk AND status = expected``. Only the
+    given columns are written; raises StatusConflict if another writer got
+    there first, or ``model.DoesNotExist`` if the row is gone. A claim
+    (Accepted with a rider) also requires the job to be unassigned or
+    already held by that rider, and raises AlreadyClaimed otherwise.
+    """
+    if 'status' in changes and not can_transition(expected, changes['status']):
+        raise InvalidTransition(expected, changes['status'])
+    queryset = model.objects.filter(pk=pk, status=expected)
+    claim = changes.get('status') == JobStatus.ACCEPTED and changes.get('rider')
+    if claim:
+        queryset = queryset.filter(Q(rider__isnull=True) | Q(rider='') | Q(rider=changes['rider']))
+    # The row and its counters commit together; the in-memory dispatch
+    # index and ride tracker only hear about it once they have.
+    with transaction.atomic():
+        if changes and not queryset.update(**changes):
+            row = model.objects.filter(pk=pk).values('status', 'rider').first()
+            if row is None:
+                raise model.DoesNotExist(f"{model.__name__} not found")
+            if claim and row['status'] == expected:
+                raise AlreadyClaimed(row['status'], row['rider'])
+            raise StatusConflict(expected, row['status'])
+        if 'status' in changes:
+            count_status_change(model, expected, changes['status'])
+        bump_model_version(model)
+        transaction.on_commit(partial(_after_status_change, model, pk, changes))
+
+
+def _after_status_change(model, pk, changes):
+    if changes.get('rider') or changes.get('status') in JOB_OVER:
+        track_assignment(model, pk, changes.get('rider'), changes.get('status'))
+    if model is Transportation and changes.get('status') in RIDE_OVER:
+        finish_ride(pk)
+
+def current_status(model, pk):
+    status = model.objects.filter(pk=pk).values_list('status', flat=True).first()
+    if status is None:
+        raise model.DoesNotExist(f"{model.__name__} not found")
+    return status
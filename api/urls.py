@@ -20,6 +20,7 @@ urlpatterns = [
     
     
     path('deliveries/submit/<int:user_id>/<int:product_id>/', views.SubmitDeliveryView.as_view(), name='submit-delivery'),
+    path('deliveries/checkout/<int:user_id>/', views.CartCheckoutView.as_view(), name='cart-checkout'),
     path('deliveries/user/<int:user_id>/', views.UserDeliveriesView.as_view(), name='user-deliveries'),
     path('deliveries/', views.DeliveryListView.as_view(), name='delivery-list'),
     path('deliveries/<int:delivery_id>/update-status/', views.UpdateDeliveryStatusView.as_view(), name='update-delivery-status'),
@@ -27,29 +28,41 @@ urlpatterns = [
     path("deliveries/<int:delivery_id>/payment/", views.UpdateDeliveryPaymentView.as_view(), name="update_delivery_payment"),
     
     path('riders/', views.RidersListView.as_view(), name='riders-list'),
+    path('riders/<int:user_id>/position/', views.RiderPositionView.as_view(), name='rider-position'),
     path('users/<int:user_id>/update-status/', views.UpdateUserStatusView.as_view(), name='update-user-status'),
     path('users/<int:userid>/delete/', views.DeleteUserView.as_view(), name='delete-user'),
+    path('users/import/', views.UserImportView.as_view(), name='user-import'),
+    path('users/search/', views.UserSearchView.as_view(), name='user-search'),
     
     
     path('transportation/<int:user_id>/create/', views.TransportationCreateView.as_view(), name='transportation-create'),
     path('transportations/<int:customer_id>/', views.CustomerTransportationListView.as_view(), name='customer-transportations'),
     path('transport-map/<int:transportation_id>/', views.TransportMapView.as_view(), name='transport-map'),
+    path('transport-map/<int:transportation_id>/location/', views.RiderLocationView.as_view(), name='rider-location'),
     path('transportations/<int:transportation_id>/update-price-payment/', 
          views.TransportationUpdatePricePaymentView.as_view(), 
          name='update-price-payment'),
     
+    path('fares/quote/', views.FareQuoteView.as_view(), name='fare-quote'),
+    path('transportations/<int:transportation_id>/quote/', views.TransportationQuoteView.as_view(), name='transportation-quote'),
     path('transports/', views.TransportationListView.as_view(), name='transport-list'),
     path('transport/<int:transport_id>/update/', views.UpdateTransportView.as_view(), name='update-transport'),
     path('transport/<int:transport_id>/payment/', views.TransportationPaymentView.as_view(), name='transport-payment'),
     
     
     
+    path('revenue/summary/', views.RevenueSummaryView.as_view(), name='revenue-summary'),
+    path('stats/', views.DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('deliveries/export/', views.DeliveryExportView.as_view(), name='delivery-export'),
+    path('transportations/export/', views.TransportationExportView.as_view(), name='transportation-export'),
+
     path('deliveries/arrived/', views.ArrivedDeliveryListView.as_view(), name='arrived-deliveries'),
     path('transportations/arrived/', views.ArrivedTransportationListView.as_view(), name='arrived-transportations'),
     
     
     
     path('chat/<int:user1_id>/<int:user2_id>/', views.ChatRoomView.as_view(), name='chat-room'),
+    path('chat/<int:user1_id>/<int:user2_id>/read/', views.ChatReadView.as_view(), name='chat-read'),
     path('chat/users/<int:user_id>/', views.UserRoomsView.as_view(), name='user-rooms'),
     path("chat-user/<str:first_name>/", views.ChatUserView.as_view(), name="chat-user"),
     
@@ -58,5 +71,9 @@ urlpatterns = [
         "products/<int:product_id>/deduct-quantity/",
         views.DeductProductQuantityView.as_view()
     ),
+    path(
+        "products/deduct-quantity/",
+        views.DeductProductQuantityBatchView.as_view()
+    ),
     
 ]
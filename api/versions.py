@@ -0,0 +1,92 @@
+import hashlib
+from functools import wraps
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.views.decorators.http import condition
+
+from .models import Products, Profile, ResourceVersion, Transportation
+
+# Which ResourceVersion key each model's writes invalidate. save() and
+# delete() bump through the signals in api/signals.py; queryset update(),
+# bulk_create() and raw SQL send no signals, so code writing that way must
+# call bump_model_version() itself once the write is done.
+VERSION_KEYS = {
+    Products: 'products',
+    Profile: 'profiles',
+    User: 'profiles',
+    Transportation: 'transportations',
+}
+
+
+def get_version(key, request=None):
+    """
+    Current counter for ``key``. Passing the request memoizes the read so the
+    ETag check and the view body share one query.
+    """
+    cache = getattr(request, '_resource_versions', None) if request is not None else None
+    if cache is not None and key in cache:
+        return cache[key]
+    version = ResourceVersion.objects.filter(key=key).values_list('version', flat=True).first() or 0
+    if request is not None:
+        if cache is None:
+            cache = request._resource_versions = {}
+        cache[key] = version
+    return version
+
+
+def bump_version(key):
+    updated = ResourceVersion.objects.filter(key=key).update(version=F('version') + 1)
+    if not updated:
+        _, created = ResourceVersion.objects.get_or_create(key=key, defaults={'version': 1})
+        if not created:
+            ResourceVersion.objects.filter(key=key).update(version=F('version') + 1)
+
+
+def bump_model_version(model):
+    if model in VERSION_KEYS:
+        bump_version(VERSION_KEYS[model])
+
+
+def conditional_get(etag_func):
+    """
+    ``condition(etag_func=...)`` that only tags successful responses, so a
+    404 for a missing id doesn't hand out an ETag clients would revalidate.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code >= 400 and response.has_header('ETag'):
+                del response['ETag']
+            return response
+        return inner
+    return decorator
+
+
+# ETag builders for conditional_get(). They only read
+# the counters, so an unchanged resource answers 304 without touching the
+# serializer.
+
+def products_etag(request, *args, **kwargs):
+    # Filtered catalog URLs are different representations, so they get
+    # their own tags.
+    query = hashlib.md5(request.GET.urlencode().encode()).hexdigest()[:12] if request.GET else 'all'
+    return f"products-{get_version('products', request)}-{query}"
+
+
+def product_etag(request, id, *args, **kwargs):
+    return f"product-{id}-{get_version('products', request)}"
+
+
+def profile_etag(request, user_id, *args, **kwargs):
+    return f"profile-{user_id}-{get_version('profiles', request)}"
+
+
+def transport_map_etag(request, transportation_id, *args, **kwargs):
+    from .tracking import tracker
+    track = tracker.recent(transportation_id, 1)
+    last_point = track[-1]['timestamp'] if track else 0
+    return f"transport-{transportation_id}-{get_version('transportations', request)}-{last_point}"
@@ -1,11 +1,36 @@
+import io
+import time
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework import status, generics
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .serializers import ProductQuantityDeductSerializer, RoomSerializer, MessageSerializer, TransportationSerializer, ProfileSerializer, RegisterSerializer, ClientsSerializer, ProductSerializer, DeliverySerializer, DeliveryListsSerializer, RiderSerializer
-from .models import Profile, Products, Delivery, Transportation, Message, Room
+from .serializers import CartCheckoutSerializer, ProductFilterSerializer, FareQuoteSerializer, FareTripSerializer, RiderPositionSerializer, RevenueFilterSerializer, LocationPointSerializer, ProductQuantityBatchDeductSerializer, ProductQuantityDeductSerializer, RoomSerializer, MessageSerializer, TransportationSerializer, ProfileSerializer, RegisterSerializer, ClientsSerializer, ProductSerializer, DeliverySerializer, DeliveryListsSerializer, RiderSerializer
+from .models import ArchivedDelivery, ArchivedTransportation, JobStatus, Profile, Products, Delivery, Transportation, Message, Room
+from .archive import TieredQuerySet
+from .authentication import IsActiveStaff
+from .catalog import search_products
+from .counters import count_created, dashboard_counts
+from .consumers import publish_chat_message, publish_ride_location
+from .dispatch import dispatch_job, rider_index, track_assignment
+from .exports import abatched, batched, csv_lines, export_rows, ndjson_lines
+from .fares import quote_trips
+from .inbox import inbox, mark_read, record_message
+from .onboarding import hash_pool, import_users, read_rows
+from .roads import road_route
+from .geo import parse_coordinates
+from .search import search_users
+from .snapshots import catalog_snapshot
+from .stock import InsufficientStock, deduct_stock, deduct_stock_batch
+from .tracking import RIDE_OVER, save_locations, tracker
+from .transitions import AlreadyClaimed, InvalidTransition, StatusConflict, compare_and_set, expected_status
+from .versions import bump_model_version, conditional_get, product_etag, products_etag, profile_etag, transport_map_etag
+from django.utils.decorators import method_decorator
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.generics import DestroyAPIView
@@ -14,8 +39,49 @@ from rest_framework import viewsets, permissions
 from rest_framework.generics import ListAPIView
 from rest_framework import status as drf_status
 from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count, Prefetch, Q, Sum, Value, prefetch_related_objects
+from django.db.models.functions import Lower, TruncDate
 User = get_user_model()
+
+
+class EagerLoadingMixin:
+    """
+    Lets the serializer join whatever it nests: if the serializer class has a
+    ``setup_eager_loading(queryset)`` hook it is applied before the list is
+    paginated and serialized, so nested fields don't cost a query per row.
+    """
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        setup = getattr(self.get_serializer_class(), 'setup_eager_loading', None)
+        if setup is not None:
+            queryset = setup(queryset)
+        return queryset
+
+
+def auto_dispatch(job, location):
+    if not settings.AUTO_DISPATCH or job.rider:
+        return
+    point = parse_coordinates(location)
+    if point is None:
+        return
+    rider = dispatch_job(type(job), job.id, *point)
+    if rider is not None:
+        job.rider = rider
+
+
+def status_error_response(error):
+    if isinstance(error, ObjectDoesNotExist):
+        # Deleted between the lookup and the conditional update.
+        return Response({"error": str(error)}, status=status.HTTP_404_NOT_FOUND)
+    if isinstance(error, InvalidTransition):
+        return Response({"error": str(error), "current_status": error.current}, status=status.HTTP_400_BAD_REQUEST)
+    if isinstance(error, AlreadyClaimed):
+        return Response({"error": str(error), "current_status": error.current, "rider": error.rider}, status=status.HTTP_409_CONFLICT)
+    return Response({"error": str(error), "current_status": error.current}, status=status.HTTP_409_CONFLICT)
+
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
@@ -71,6 +137,7 @@ class RegisterView(APIView):
 
 
 
+@method_decorator(conditional_get(profile_etag), name='get')
 class UserProfileView(APIView):
     permission_classes = [AllowAny]
     def get(self, request, user_id):
@@ -97,11 +164,37 @@ class ProductCreateView(generics.CreateAPIView):
     serializer_class = ProductSerializer
 
 
+@method_decorator(conditional_get(products_etag), name='get')
 class ProductListView(generics.ListAPIView):
     permission_classes = [AllowAny]
     queryset = Products.objects.all().order_by('-date_posted')
     serializer_class = ProductSerializer
 
+    def get_queryset(self):
+        # ?q= searches name/type (full-text, word prefixes); ?type=, ?status=
+        # and ?in_stock=true filter on indexed columns.
+        serializer = ProductFilterSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+        queryset = super().get_queryset()
+        if filters.get('q'):
+            queryset = search_products(queryset, filters['q'])
+        if 'type' in filters:
+            queryset = queryset.filter(type=filters['type'])
+        if 'status' in filters:
+            queryset = queryset.filter(status=filters['status'])
+        if filters['in_stock'] is not None:
+            queryset = queryset.filter(quantity__gt=0) if filters['in_stock'] else queryset.filter(quantity__lte=0)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Filtered or paginated requests go to the database; the plain
+        # catalog is served from the in-process snapshot.
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        data = catalog_snapshot.get(request, lambda: super(ProductListView, self).list(request, *args, **kwargs).data)
+        return Response(data)
+
 class ProductDetailView(generics.RetrieveUpdateAPIView):
     permission_classes = [AllowAny]
     queryset = Products.objects.all()
@@ -129,6 +222,7 @@ class ProductDeleteView(DestroyAPIView):
             return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+@method_decorator(conditional_get(product_etag), name='get')
 class ProductDetailView(generics.RetrieveUpdateAPIView):
     permission_classes = [AllowAny]
     queryset = Products.objects.all()
@@ -158,29 +252,121 @@ class SubmitDeliveryView(APIView):
             'location': request.data.get('location', ''),
             'delivery_issued': request.data.get('delivery_issued', ''),
             'quantity': request.data.get('quantity', 1),
-            'price': request.data.get('price', product.price),
+            'price': request.data.get('price'),
         }
 
         serializer = DeliverySerializer(data=delivery_data)
         if serializer.is_valid():
-            serializer.save()
+            # Delivery.price is the line total, as in CartCheckoutView.
+            line_total = {}
+            if serializer.validated_data.get('price') is None and product.price is not None:
+                line_total['price'] = product.price * serializer.validated_data.get('quantity', 1)
+            delivery = serializer.save(**line_total)
+            auto_dispatch(delivery, delivery.location)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 
-class UserDeliveriesView(generics.ListAPIView):
+class CartCheckoutView(APIView):
+    """
+    Checks out a whole cart: one bulk product fetch, stock reserved for every
+    line, and all Delivery rows inserted with a single bulk insert, inside one
+    transaction. Each line is then dispatched like a SubmitDeliveryView
+    order (the bulk insert fires no signals, so a named rider is marked
+    busy here).
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, user_id):
+        serializer = CartCheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if not User.objects.filter(id=user_id).exists():
+            return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        lines = [(item['product_id'], item['quantity']) for item in data['items']]
+        products = Products.objects.in_bulk({product_id for product_id, _ in lines})
+        missing = sorted({product_id for product_id, _ in lines} - products.keys())
+        if missing:
+            return Response({'error': 'Product not found', 'product_ids': missing}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            with transaction.atomic():
+                deduct_stock_batch(lines)
+                deliveries = Delivery.objects.bulk_create([
+                    Delivery(
+                        customer_id=user_id,
+                        products_id=product_id,
+                        quantity=quantity,
+                        price=None if products[product_id].price is None else products[product_id].price * quantity,
+                        rider=data['rider'],
+                        location=data['location'],
+                        message=data['message'],
+                    )
+                    for product_id, quantity in lines
+                ])
+                count_created(deliveries)
+        except InsufficientStock as e:
+            return Response(
+                {'detail': 'Insufficient stock', 'product_id': e.product_id},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        for delivery in deliveries:
+            if delivery.rider:
+                track_assignment(Delivery, delivery.id, delivery.rider, delivery.status)
+            else:
+                auto_dispatch(delivery, delivery.location)
+        return Response(DeliverySerializer(deliveries, many=True).data, status=status.HTTP_201_CREATED)
+
+
+class UserDeliveriesView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = DeliveryListsSerializer
     permission_classes = [AllowAny]
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
-        return Delivery.objects.filter(customer_id=user_id).order_by('-id')
+        return TieredQuerySet(
+            Delivery.objects.filter(customer_id=user_id).order_by('-id'),
+            ArchivedDelivery.objects.filter(customer_id=user_id),
+        )
 
 
 
 
-class RidersListView(generics.ListAPIView):
+class RiderPositionView(APIView):
+    """
+    Idle riders report where they are; the position only goes into the
+    in-memory dispatch index. ``available: false`` takes the rider out of it,
+    and reports from a rider with an unfinished job are ignored
+    (``busy: true``).
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, user_id):
+        serializer = RiderPositionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if not data["available"]:
+            rider_index.remove(user_id)
+            return Response({"available": False}, status=status.HTTP_200_OK)
+
+        entry = rider_index.get(user_id)
+        if entry is not None:
+            name = entry[2]
+        else:
+            name = User.objects.filter(id=user_id, profile__role="Rider").values_list("first_name", flat=True).first()
+            if name is None:
+                return Response({"error": "Rider not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not rider_index.update(user_id, data["lat"], data["lng"], name):
+            return Response({"available": False, "busy": True}, status=status.HTTP_200_OK)
+        return Response({"available": True}, status=status.HTTP_200_OK)
+
+
+class RidersListView(EagerLoadingMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
     queryset = User.objects.all()
     serializer_class = RiderSerializer
@@ -205,6 +391,29 @@ class UpdateUserStatusView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class UserImportView(APIView):
+    """
+    Staff-only bulk registration: upload a CSV as ``file`` (username,
+    password, first_name, email, role) and get back how many users were
+    created plus the duplicate and invalid lines. See api/onboarding.py.
+    """
+    permission_classes = [IsActiveStaff]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "A CSV file is required."}, status=status.HTTP_400_BAD_REQUEST)
+        pool, workers = hash_pool()
+        try:
+            report = import_users(
+                read_rows(io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')), workers=workers, pool=pool
+            )
+        except ValueError as e:  # bad encoding or missing columns
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_200_OK)
+
+
 class DeleteUserView(APIView):
     permission_classes = [AllowAny]
     def delete(self, request, userid):
@@ -213,11 +422,13 @@ class DeleteUserView(APIView):
         return Response({"message": "User deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
 
 
-class DeliveryListView(generics.ListAPIView):
+class DeliveryListView(EagerLoadingMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
-    queryset = Delivery.objects.all()
     serializer_class = DeliveryListsSerializer
 
+    def get_queryset(self):
+        return TieredQuerySet(Delivery.objects.order_by('id'), ArchivedDelivery.objects.all())
+
 
 class UpdateDeliveryStatusView(generics.UpdateAPIView):
     queryset = Delivery.objects.all()
@@ -229,9 +440,22 @@ class UpdateDeliveryStatusView(generics.UpdateAPIView):
         delivery = get_object_or_404(Delivery, id=kwargs.get(self.lookup_url_kwarg))
         serializer = self.get_serializer(delivery, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+
+        # Conditional UPDATE of just the sent columns; a rider who loses the
+        # race gets a 409 instead of overwriting the winner.
+        changes = dict(serializer.validated_data)
+        payment = changes.pop('payment', None)
+        expected = expected_status(changes.get('status'), request.data.get('expected_status'), delivery.status)
+        try:
+            compare_and_set(Delivery, delivery.id, expected, changes)
+        except (InvalidTransition, StatusConflict, Delivery.DoesNotExist) as e:
+            return status_error_response(e)
+        if payment is not None:
+            delivery.payment = payment
+            delivery.save(update_fields=['payment'])
 
         # ✅ return fresh serialized object after update
+        delivery.refresh_from_db()
         return Response(self.get_serializer(delivery).data, status=status.HTTP_200_OK)
 
 class DeleteDeliveryView(generics.DestroyAPIView):
@@ -256,6 +480,10 @@ class TransportationCreateView(generics.CreateAPIView):
         context['user_id'] = self.kwargs['user_id']
         return context
 
+    def perform_create(self, serializer):
+        transport = serializer.save()
+        auto_dispatch(transport, transport.current_location)
+
 
 class CustomerTransportationListView(generics.ListAPIView):
     serializer_class = TransportationSerializer
@@ -264,10 +492,14 @@ class CustomerTransportationListView(generics.ListAPIView):
     def get_queryset(self):
         customer_id = self.kwargs['customer_id']
         customer = get_object_or_404(User, id=customer_id)
-        return Transportation.objects.filter(customer=customer).order_by('-id')
+        return TieredQuerySet(
+            Transportation.objects.filter(customer=customer).order_by('-id'),
+            ArchivedTransportation.objects.filter(customer=customer),
+        )
 
 
 
+@method_decorator(conditional_get(transport_map_etag), name='get')
 class TransportMapView(APIView):
     permission_classes = [AllowAny]
 
@@ -278,7 +510,50 @@ class TransportMapView(APIView):
             return Response({"detail": "Not found."}, status=404)
 
         serializer = TransportationSerializer(transportation)
-        return Response(serializer.data)
+        data = serializer.data
+        data["track"] = tracker.recent(transportation.id)
+
+        # Road route and ETA from the rider's latest point (or the pickup).
+        latest = data["track"][-1:]
+        origin = (latest[0]["lat"], latest[0]["lng"]) if latest else parse_coordinates(transportation.current_location)
+        destination = parse_coordinates(transportation.destination)
+        data["route"] = road_route(origin, destination) if origin and destination else None
+        return Response(data)
+
+
+class RiderLocationView(APIView):
+    """
+    GPS ingest for an active ride. Accepts one point (``lat``/``lng``) or a
+    batch under ``points``; points go to the in-memory tracker and out to the
+    customer's map socket, and only a periodic snapshot reaches the database.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, transportation_id):
+        if not tracker.is_tracking(transportation_id):
+            if not Transportation.objects.filter(id=transportation_id).exclude(status__in=RIDE_OVER).exists():
+                return Response({"detail": "No active ride found."}, status=status.HTTP_404_NOT_FOUND)
+
+        many = "points" in request.data
+        serializer = LocationPointSerializer(data=request.data["points"] if many else request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+
+        now = time.time()
+        points = [
+            {"lat": p["lat"], "lng": p["lng"], "timestamp": p.get("timestamp", now)}
+            for p in (serializer.validated_data if many else [serializer.validated_data])
+        ]
+        if not points:
+            return Response({"error": "No points given"}, status=status.HTTP_400_BAD_REQUEST)
+
+        latest, flush_due = tracker.record(transportation_id, points)
+        # Rides that went quiet without ending still get their last point saved.
+        to_save = tracker.evict_stale()
+        if flush_due:
+            to_save[transportation_id] = latest
+        save_locations(to_save)
+        publish_ride_location(transportation_id, points)
+        return Response({"accepted": len(points)}, status=status.HTTP_202_ACCEPTED)
 
 
 class TransportationUpdatePricePaymentView(generics.UpdateAPIView):
@@ -308,10 +583,41 @@ class TransportationUpdatePricePaymentView(generics.UpdateAPIView):
 
 
 
+class FareQuoteView(APIView):
+    """Quotes for up to 1000 ``{current_location, destination}`` pairs in one call."""
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = FareQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        trips = [(trip["current_location"], trip["destination"]) for trip in serializer.validated_data["trips"]]
+        return Response(quote_trips(trips), status=status.HTTP_200_OK)
+
+
+class TransportationQuoteView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, transportation_id):
+        transportation = get_object_or_404(Transportation, id=transportation_id)
+        serializer = FareTripSerializer(data={
+            "current_location": transportation.current_location or "",
+            "destination": transportation.destination or "",
+        })
+        serializer.is_valid(raise_exception=True)
+        trip = serializer.validated_data
+        return Response(quote_trips([(trip["current_location"], trip["destination"])])[0], status=status.HTTP_200_OK)
+
+
 class TransportationListView(generics.ListAPIView):
     permission_classes = [AllowAny]
-    queryset = Transportation.objects.all().order_by('-date_requested')
     serializer_class = TransportationSerializer
+    cursor_ordering = '-date_requested'
+
+    def get_queryset(self):
+        return TieredQuerySet(
+            Transportation.objects.order_by('-date_requested'),
+            ArchivedTransportation.objects.all(),
+        )
 
 
 class UpdateTransportView(APIView):
@@ -326,10 +632,25 @@ class UpdateTransportView(APIView):
             if not User.objects.filter(first_name=rider_name).exists():
                 return Response({"error": "Rider not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            # Save only the text (not a User object)
-            transport.rider = rider_name
+            # Save only the text (not a User object). The job must still be
+            # unassigned (or held by expected_rider when reassigning), so two
+            # riders accepting at once can't both win.
+            claimable = Q(rider__isnull=True) | Q(rider="") | Q(rider=rider_name)
+            expected_rider = request.data.get("expected_rider")
+            if expected_rider:
+                claimable |= Q(rider=expected_rider)
+            claimed = Transportation.objects.filter(claimable, id=transport_id).exclude(
+                status__in=RIDE_OVER
+            ).update(rider=rider_name)
+            transport.refresh_from_db()
+            if not claimed:
+                return Response(
+                    {"error": "Ride is already taken", "rider": transport.rider, "current_status": transport.status},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            bump_model_version(Transportation)
+            track_assignment(Transportation, transport.id, transport.rider, transport.status)
 
-        transport.save()
         serializer = TransportationSerializer(transport)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -355,19 +676,29 @@ class TransportationPaymentView(generics.RetrieveUpdateAPIView):
         serializer = self.get_serializer(transport, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
 
-        # Save payment image
-        if "payment" in request.data:
-            transport.payment = request.data["payment"]
-
+        changes = {}
         # Update status
         if "status" in request.data:
-            transport.status = request.data["status"]
+            if request.data["status"] not in JobStatus.values:
+                return Response({"status": [f'"{request.data["status"]}" is not a valid choice.']}, status=drf_status.HTTP_400_BAD_REQUEST)
+            changes["status"] = request.data["status"]
 
         # Update price
-        if "price" in request.data:
-            transport.price = request.data["price"]
+        if "price" in serializer.validated_data:
+            changes["price"] = serializer.validated_data["price"]
+
+        expected = expected_status(changes.get("status"), request.data.get("expected_status"), transport.status)
+        try:
+            compare_and_set(Transportation, transport.id, expected, changes)
+        except (InvalidTransition, StatusConflict, Transportation.DoesNotExist) as e:
+            return status_error_response(e)
+
+        # Save payment image
+        if "payment" in serializer.validated_data:
+            transport.payment = serializer.validated_data["payment"]
+            transport.save(update_fields=["payment"])
 
-        transport.save()
+        transport.refresh_from_db()
         return Response(TransportationSerializer(transport).data, status=drf_status.HTTP_200_OK)
 
 
@@ -387,36 +718,67 @@ class UpdateDeliveryPaymentView(APIView):
         return self.put(request, delivery_id)
 
 
-class ArrivedDeliveryListView(generics.ListAPIView):
+class ArrivedDeliveryListView(EagerLoadingMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = DeliveryListsSerializer
 
     def get_queryset(self):
-        return Delivery.objects.filter(status='Arrived')
+        return TieredQuerySet(
+            Delivery.objects.filter(status='Arrived').order_by('id'),
+            ArchivedDelivery.objects.filter(status='Arrived'),
+        )
 
 
 class ArrivedTransportationListView(generics.ListAPIView):
     permission_classes = [AllowAny]
     serializer_class = TransportationSerializer
+    cursor_ordering = '-date_requested'
 
     def get_queryset(self):
-        return Transportation.objects.filter(status="Arrived")
+        return TieredQuerySet(
+            Transportation.objects.filter(status="Arrived").order_by('id'),
+            ArchivedTransportation.objects.filter(status="Arrived"),
+        )
 
 
 class ChatRoomView(APIView):
     permission_classes = [AllowAny]
+    page_limit = 50
+    max_page_limit = 200
 
     def get(self, request, user1_id, user2_id):
+        rooms = Room.objects.select_related("user1", "user2")
         try:
-            room = Room.objects.get(user1_id=user1_id, user2_id=user2_id)
+            room = rooms.get(user1_id=user1_id, user2_id=user2_id)
         except Room.DoesNotExist:
             try:
-                room = Room.objects.get(user1_id=user2_id, user2_id=user1_id)
+                room = rooms.get(user1_id=user2_id, user2_id=user1_id)
             except Room.DoesNotExist:
                 return Response({"error": "Room not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = RoomSerializer(room)
-        return Response(serializer.data)
+        after_id = request.query_params.get("after_id")
+        before_id = request.query_params.get("before_id")
+        if after_id is None and before_id is None:
+            prefetch_related_objects(
+                [room], Prefetch("messages", queryset=Message.objects.select_related("sender").order_by("id"))
+            )
+            serializer = RoomSerializer(room)
+            return Response(serializer.data)
+
+        # Incremental mode: only messages past the client's cursor, senders joined.
+        try:
+            limit = int(request.query_params.get("limit", self.page_limit))
+            limit = max(1, min(limit, self.max_page_limit))
+            messages = Message.objects.filter(room=room).select_related("sender")
+            if after_id is not None:
+                messages = messages.filter(id__gt=int(after_id)).order_by("id")[:limit]
+            else:
+                messages = reversed(messages.filter(id__lt=int(before_id)).order_by("-id")[:limit])
+        except ValueError:
+            return Response({"error": "after_id, before_id and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = MessageSerializer(list(messages), many=True)
+        return Response({"id": room.id, "messages": serializer.data})
 
     def post(self, request, user1_id, user2_id):
         sender_id = request.data.get("sender_id")
@@ -437,31 +799,88 @@ class ChatRoomView(APIView):
             user2_id=max(user1_id, user2_id)
         )
 
-        message = Message.objects.create(room=room, sender=sender, content=content)
+        with transaction.atomic():
+            message = Message.objects.create(room=room, sender=sender, content=content)
+            record_message(room, message)
         serializer = MessageSerializer(message)
+        publish_chat_message(room, serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 
+class ChatReadView(APIView):
+    """
+    Moves ``user_id``'s read marker in the room up to ``message_id``
+    (default: the newest message), which clears the inbox unread count.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, user1_id, user2_id):
+        room = Room.objects.filter(
+            Q(user1_id=user1_id, user2_id=user2_id) | Q(user1_id=user2_id, user2_id=user1_id)
+        ).first()
+        if room is None:
+            return Response({"error": "Room not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            reader_id = int(request.data.get("user_id"))
+            message_id = request.data.get("message_id")
+            message_id = int(message_id) if message_id is not None else None
+        except (TypeError, ValueError):
+            return Response({"error": "user_id and message_id must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if reader_id not in (room.user1_id, room.user2_id):
+            return Response({"error": "User is not in this room"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            mark_read(room, reader_id, message_id)
+        except Message.DoesNotExist:
+            return Response({"error": "Message not found in this room"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class UserRoomsView(APIView):
+    """
+    The user's inbox: one entry per room with the partner, the last message
+    and the unread count, newest first, from a single query.
+    """
     permission_classes = [AllowAny]
 
     def get(self, request, user_id):
-        rooms = Room.objects.filter(user1_id=user_id) | Room.objects.filter(user2_id=user_id)
-        rooms = rooms.distinct()
-
-        # Get the other user in each room
-        user_ids = []
-        for room in rooms:
-            if room.user1_id == user_id:
-                user_ids.append(room.user2_id)
-            else:
-                user_ids.append(room.user1_id)
+        data = []
+        for room in inbox(user_id):
+            partner = room.user2 if room.user1_id == user_id else room.user1
+            data.append({
+                "id": partner.id,
+                "first_name": partner.first_name,
+                "username": partner.username,
+                "room_id": room.id,
+                "last_message": {
+                    "id": room.last_message_id,
+                    "sender_id": room.last_sender_id,
+                    "content": room.last_message_preview,
+                    "timestamp": room.last_message_at,
+                } if room.last_message_id else None,
+                "unread_count": room.unread,
+            })
+        return Response(data)
 
-        users = User.objects.filter(id__in=user_ids)
-        data = [{"id": u.id, "first_name": u.first_name, "username": u.username} for u in users]
 
-        return Response(data)
+class UserSearchView(APIView):
+    """
+    Type-ahead for starting a chat: ``?q=`` matches the start of any word
+    of a first name or of a username, case- and accent-insensitively, and
+    returns up to ``limit`` (default 10, max 50) ranked users.
+    """
+    permission_classes = [AllowAny]
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.max_limit))
+        return Response(search_users(request.query_params.get("q", ""), limit), status=status.HTTP_200_OK)
 
 
 class ChatUserView(APIView):
@@ -469,7 +888,11 @@ class ChatUserView(APIView):
 
     def get(self, request, first_name):
         try:
-            users = User.objects.filter(first_name__iexact=first_name).values("id", "first_name", "username")
+            # LOWER() on both sides (rather than iexact's LIKE) matches the
+            # auth_user_first_name_lower_idx expression index.
+            users = User.objects.annotate(first_name_lower=Lower("first_name")).filter(
+                first_name_lower=Lower(Value(first_name))
+            ).values("id", "first_name", "username")
             if not users.exists():
                 return Response({"error": "No user found with that first name"}, status=status.HTTP_404_NOT_FOUND)
             return Response(users, status=status.HTTP_200_OK)
@@ -482,28 +905,162 @@ class ChatUserView(APIView):
 
 class DeductProductQuantityView(APIView):
     permission_classes = [AllowAny]
-    
+
     def patch(self, request, product_id):
-        product = get_object_or_404(Products, id=product_id)
         serializer = ProductQuantityDeductSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        deduct_qty = serializer.validated_data["quantity"]
-
-        with transaction.atomic():
-            if product.quantity < deduct_qty:
-                return Response(
-                    {"detail": "Insufficient stock"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            product.quantity -= deduct_qty
-            product.save(update_fields=["quantity"])
+        try:
+            remaining = deduct_stock(product_id, serializer.validated_data["quantity"])
+        except InsufficientStock:
+            get_object_or_404(Products, id=product_id)
+            return Response(
+                {"detail": "Insufficient stock"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         return Response(
             {
-                "product_id": product.id,
-                "remaining_quantity": product.quantity
+                "product_id": product_id,
+                "remaining_quantity": remaining
             },
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class DeductProductQuantityBatchView(APIView):
+    permission_classes = [AllowAny]
+
+    def patch(self, request):
+        serializer = ProductQuantityBatchDeductSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        items = [(item["product_id"], item["quantity"]) for item in serializer.validated_data["items"]]
+        try:
+            remaining = deduct_stock_batch(items)
+        except InsufficientStock as e:
+            return Response(
+                {"detail": "Insufficient stock", "product_id": e.product_id},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(
+            [{"product_id": pid, "remaining_quantity": qty} for pid, qty in remaining.items()],
+            status=status.HTTP_200_OK
+        )
+
+
+class RevenueSummaryView(APIView):
+    """
+    Revenue totals per day, per rider and per product. Optional
+    ``start``/``end`` (YYYY-MM-DD) and ``status`` filters apply to both
+    deliveries and transportations.
+
+    Each table is read by a single GROUP BY (day, rider[, product]) query
+    per tier (hot and archive, so archived jobs keep their revenue) and the
+    three breakdowns are summed from those rows in Python: four queries in
+    all. Deliveries and transportations are separate tables with different
+    columns, so one statement would need a UNION whose column order Django
+    doesn't guarantee for annotated values().
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        serializer = RevenueFilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+
+        deliveries = self.filtered(
+            TieredQuerySet(Delivery.objects.all(), ArchivedDelivery.objects.all(), ordering=("day",)),
+            "delivery_issued", filters,
+        ).annotate(day=TruncDate("delivery_issued")).values("day", "rider", "products_id", "products__name").annotate(
+            total=Sum("price"), quantity=Sum("quantity"), count=Count("id")
+        )
+        transportations = self.filtered(
+            TieredQuerySet(Transportation.objects.all(), ArchivedTransportation.objects.all(), ordering=("day",)),
+            "date_requested", filters,
+        ).annotate(day=TruncDate("date_requested")).values("day", "rider").annotate(total=Sum("price"), count=Count("id"))
+
+        per_day, per_rider, per_product = {}, {}, {}
+        for source, rows in (("deliveries", deliveries), ("transportations", transportations)):
+            for row in rows:
+                total = row["total"] or 0
+                day = per_day.setdefault(row["day"], {"day": row["day"], "deliveries": 0, "transportations": 0, "total": 0})
+                day[source] += total
+                day["total"] += total
+                rider = per_rider.setdefault(row["rider"], {"rider": row["rider"], "total": 0, "count": 0})
+                rider["total"] += total
+                rider["count"] += row["count"]
+                if source == "deliveries":
+                    product = per_product.setdefault(row["products_id"], {
+                        "product_id": row["products_id"], "name": row["products__name"],
+                        "total": 0, "quantity": 0, "count": 0,
+                    })
+                    product["total"] += total
+                    product["quantity"] += row["quantity"] or 0
+                    product["count"] += row["count"]
+
+        return Response({
+            "per_day": sorted(per_day.values(), key=lambda d: d["day"]),
+            "per_rider": sorted(per_rider.values(), key=lambda r: r["total"], reverse=True),
+            "per_product": sorted(per_product.values(), key=lambda p: p["total"], reverse=True),
+        })
+
+    @staticmethod
+    def filtered(queryset, date_field, filters):
+        if "start" in filters:
+            queryset = queryset.filter(**{f"{date_field}__date__gte": filters["start"]})
+        if "end" in filters:
+            queryset = queryset.filter(**{f"{date_field}__date__lte": filters["end"]})
+        if "status" in filters:
+            queryset = queryset.filter(status=filters["status"])
+        return queryset
+
+
+class DashboardStatsView(APIView):
+    """
+    Job counts by status, rides requested today and riders by status, read
+    from the counters kept by api/counters.py instead of counting the lists.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response(dashboard_counts(), status=status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    """
+    Streams every row (hot and archived) as NDJSON (default) or CSV with
+    ``?type=csv``. Same ``start``/``end``/``status`` filters as the revenue
+    summary. Rows are read with a chunked iterator and written as they
+    arrive, so memory doesn't grow with the export; under ASGI the body is
+    an async iterator, which Django streams instead of buffering.
+    """
+    permission_classes = [AllowAny]
+    export_name = None
+    formats = {
+        "ndjson": (ndjson_lines, "application/x-ndjson"),
+        "csv": (csv_lines, "text/csv"),
+    }
+
+    def get(self, request):
+        serializer = RevenueFilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        export_type = request.query_params.get("type", "ndjson")
+        if export_type not in self.formats:
+            return Response({"type": [f"Choose one of: {', '.join(self.formats)}."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines, content_type = self.formats[export_type]
+        body = lines(self.export_name, export_rows(self.export_name, serializer.validated_data))
+        chunks = abatched(body) if isinstance(request._request, ASGIRequest) else batched(body)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{self.export_name}.{export_type}"'
+        return response
+
+
+class DeliveryExportView(ExportView):
+    export_name = "deliveries"
+
+
+class TransportationExportView(ExportView):
+    export_name = "transportations"
@@ -31,19 +31,33 @@ ALLOWED_HOSTS = ['*']
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.OptInCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
+# Old app builds expect bare lists; only paginate when the client sends
+# ?cursor= or ?page_size= unless this is switched on.
+CURSOR_PAGINATION_BY_DEFAULT = os.environ.get('CURSOR_PAGINATION_BY_DEFAULT', '') == '1'
+
 SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(days=30),
+    # Access tokens are trusted without a users-table lookup, so keep them
+    # short; the refresh endpoint re-checks the account.
+    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=50),
+    # request.user comes from the token claims, not a users-table lookup.
+    'TOKEN_USER_CLASS': 'api.authentication.ClaimsUser',
 }
 
+# How long ClaimsUser.full_user keeps a loaded User row in this process.
+AUTH_USER_CACHE_SECONDS = 30
+
 INSTALLED_APPS = [
+    'daphne',  # ASGI runserver so websockets work in development
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -85,17 +99,102 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
+
+# Chat push fan-out. The in-memory layer only reaches sockets in the same
+# process; set REDIS_URL when running several workers.
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ['REDIS_URL']]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'},
+    }
+
+# Live rider tracking: points kept in memory per ride, and how often the
+# newest one is written back to Transportation.current_location.
+RIDE_TRACK_MAX_POINTS = 100
+RIDE_TRACK_FLUSH_SECONDS = 15
+# Rides with no point for this long are dropped from memory (last point saved).
+RIDE_TRACK_STALE_SECONDS = 3600
+
+# Automatic dispatch of new rides/deliveries to the nearest idle rider that
+# has reported a position (see api/dispatch.py). Jobs nobody can take stay
+# unassigned for the admin, as before.
+AUTO_DISPATCH = os.environ.get('AUTO_DISPATCH', '1') == '1'
+DISPATCH_CELL_DEGREES = 0.01  # ~1.1 km grid cells
+DISPATCH_CANDIDATES = 5
+DISPATCH_MAX_KM = 15
+
+# Distance-based fare quotes (api/fares.py), in pesos.
+FARE_BASE = 20
+FARE_PER_KM = 10
+FARE_MINIMUM = 20
+
+# Offline routing (api/roads.py): GeoJSON road extract loaded at startup.
+# Unset means straight-line distances everywhere.
+ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH') or None
+ROAD_SNAP_MAX_KM = 0.5
+
+# Arrived jobs older than this are moved to the archive tables by
+# `manage.py archive_jobs` (run it daily from cron).
+ARCHIVE_AFTER_DAYS = 30
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE=sqlite (default) or postgres.
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+if DB_PROFILE == 'postgres':
+    # Needs psycopg[pool]; Django's built-in pool replaces CONN_MAX_AGE.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'pasugo'),
+            'USER': os.environ.get('POSTGRES_USER', 'pasugo'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 20)),
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+else:
+    # WAL lets chat reads run alongside writers; IMMEDIATE transactions take
+    # the write lock up front so busy_timeout can queue them instead of
+    # failing on lock upgrade. No persistent connections: under daphne each
+    # sync_to_async call may run on a fresh thread, so a kept connection is
+    # never reused or closed.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=20000;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
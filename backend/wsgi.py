@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Load the road graph (if ROAD_GRAPH_PATH is set) before the first request.
+from api.roads import get_road_graph  # noqa: E402
+get_road_graph()